@@ -0,0 +1,71 @@
+# Bing 搜图结果解析对比：BeautifulSoup 整页解析 vs 只扫描 iusc 标签的正则提取
+# 用法: python benchmarks/bench_bing.py [保存下来的 Bing 结果页.html]，不给文件时生成一份结构相近的模拟页面
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from services.crawler import extract_bing_images
+
+
+def fake_page(count=35, filler=400):
+    parts = ["<html><head>", "<script>var x = 1;</script>" * filler, "</head><body><ul>"]
+    for i in range(count):
+        # 标题里带 ">"（属性值内不一定转义）的情况也要覆盖到
+        desc = "壁纸 " * 20 + ("<4K> 1920>1080" if i % 3 == 0 else "")
+        m = json.dumps({"sid": str(i), "murl": f"https://img.example.com/full/{i}.jpg",
+                        "turl": f"https://tse.mm.bing.net/th?id=OIP.{i}", "desc": desc},
+                       ensure_ascii=False).replace('"', "&quot;")
+        # class 可能带其他类名，属性顺序也不固定
+        attrs = [f'class="{"iusc" if i % 2 else "iusc hoff"}"', 'style="height:180px"', f'm="{m}"', 'mad="{}"']
+        if i % 4 == 1: attrs.reverse()
+        parts.append(f'<li><div class="imgpt"><a {" ".join(attrs)} '
+                     f'href="/images/search?view=detailV2&amp;id={i}"><div class="img_cont hoff">'
+                     f'<img class="mimg" src="https://tse.mm.bing.net/th?id=OIP.{i}" alt="x"/></div></a>'
+                     f'<div class="infopt">{"<span>meta</span>" * 30}</div></div></li>')
+    parts.append("</ul>" + "<div class='footer'><a href='#'>link</a></div>" * filler + "</body></html>")
+    return "".join(parts)
+
+
+def extract_soup(page_html):
+    # 改动前 search_images_bing 的解析逻辑（不含打乱与截断）
+    soup = BeautifulSoup(page_html, 'html.parser')
+    results = []
+    for link in soup.select('a.iusc'):
+        try:
+            m_data = json.loads(link.get('m'))
+            img_url = m_data.get('turl') or m_data.get('murl')
+            if img_url: results.append({"url": m_data.get('murl'), "thumb": img_url})
+        except:
+            continue
+    return results
+
+
+def bench(func, page_html, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = func(page_html)
+    return (time.perf_counter() - start) / rounds, results
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            page_html = f.read()
+    else:
+        page_html = fake_page()
+    rounds = 20
+    soup_time, soup_results = bench(extract_soup, page_html, rounds)
+    regex_time, regex_results = bench(extract_bing_images, page_html, rounds)
+    print(f"页面大小: {len(page_html) / 1024:.0f} KB, 结果数: BeautifulSoup {len(soup_results)} / 正则 {len(regex_results)}")
+    print(f"BeautifulSoup: {soup_time * 1000:.2f} ms/页")
+    print(f"正则提取:      {regex_time * 1000:.2f} ms/页 ({soup_time / regex_time:.0f}x)")
+    if soup_results != regex_results: print("警告: 两种解析结果不一致")
+
+
+if __name__ == "__main__":
+    main()
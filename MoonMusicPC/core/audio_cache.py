@@ -0,0 +1,169 @@
+import json
+import os
+import time
+from collections import OrderedDict, deque
+
+INDEX_FILE = ".index.json"
+# 未下载完的 .part 旁边记录其来源文件名和校验值的附属文件后缀，续传前据此确认是同一个文件
+PART_META_SUFFIX = ".src"
+# 放弃的 .part（预取被取消、换源落选）留着续传，闲置超过这么久（秒）就删掉
+PART_MAX_AGE = 2 * 24 * 3600
+
+
+# temp_cache 目录的容量管理：按最近播放时间做 LRU 淘汰，索引落盘以免每次启动 stat 全部文件
+class AudioCache:
+    def __init__(self, folder="temp_cache", max_bytes=1024 * 1024 * 1024, part_max_age=PART_MAX_AGE):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.part_max_age = part_max_age
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        # 未完成的 .part 不进索引，但占用的空间同样计入容量上限
+        self.part_bytes = 0
+        self.protected = deque(maxlen=8)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_evicted = 0
+        self.files_evicted = 0
+        self._dirty = False
+        self.load()
+        self.sweep_parts()
+        self.evict()
+
+    def owns(self, folder):
+        return os.path.normpath(folder) == os.path.normpath(self.folder)
+
+    def load(self):
+        if not os.path.exists(self.folder): return
+        index = {}
+        try:
+            with open(os.path.join(self.folder, INDEX_FILE), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except:
+            pass
+        # 目录列表不触发 stat，只有索引里没有的新文件才需要读取大小
+        names = set()
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.name.startswith(".") or entry.name.endswith((".part", f".part{PART_META_SUFFIX}")) or \
+                        not entry.is_file(): continue
+                names.add(entry.name)
+        rows = []
+        for name in names:
+            meta = index.get(name)
+            if meta is None:
+                try:
+                    st = os.stat(os.path.join(self.folder, name))
+                except OSError:
+                    continue
+                meta = {"size": st.st_size, "mtime": st.st_mtime, "last_play": st.st_mtime}
+                self._dirty = True
+            rows.append((name, meta))
+        if len(rows) != len(index): self._dirty = True
+        rows.sort(key=lambda r: r[1].get("last_play", 0))
+        for name, meta in rows:
+            self.entries[name] = meta
+            self.total_bytes += meta.get("size", 0)
+
+    def save(self):
+        if not self._dirty or not os.path.exists(self.folder): return
+        path = os.path.join(self.folder, INDEX_FILE)
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, path)
+            self._dirty = False
+        except Exception as e:
+            print(f"缓存索引写入失败: {e}")
+
+    def hit(self, filepath):
+        self.hits += 1
+        if os.path.basename(filepath) in self.entries:
+            self.touch(filepath)
+        else:
+            self.add(filepath)
+
+    def miss(self):
+        self.misses += 1
+
+    def touch(self, filepath):
+        name = os.path.basename(filepath)
+        meta = self.entries.get(name)
+        if meta is None: return
+        meta["last_play"] = time.time()
+        self.entries.move_to_end(name)
+        self._dirty = True
+
+    def add(self, filepath):
+        name = os.path.basename(filepath)
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return
+        old = self.entries.pop(name, None)
+        if old: self.total_bytes -= old.get("size", 0)
+        self.entries[name] = {"size": st.st_size, "mtime": st.st_mtime, "last_play": time.time()}
+        self.total_bytes += st.st_size
+        self._dirty = True
+        self.sweep_parts()
+        self.evict(keep=name)
+        self.save()
+
+    def sweep_parts(self):
+        # 删除闲置过久的 .part 及其来源记录，其余的大小计入 part_bytes；正在下载的文件 mtime 一直在更新，不会被删
+        if not os.path.exists(self.folder): return
+        now = time.time()
+        total = 0
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.name.endswith(".part") or not entry.is_file(): continue
+                try:
+                    st = entry.stat()
+                    if now - st.st_mtime > self.part_max_age:
+                        os.remove(entry.path)
+                        if os.path.exists(f"{entry.path}{PART_META_SUFFIX}"): os.remove(f"{entry.path}{PART_META_SUFFIX}")
+                        continue
+                except OSError:
+                    continue
+                total += st.st_size
+        self.part_bytes = total
+
+    def get_duration(self, filepath):
+        meta = self.entries.get(os.path.basename(filepath))
+        return meta.get("duration") if meta else None
+
+    def set_duration(self, filepath, duration):
+        meta = self.entries.get(os.path.basename(filepath))
+        if meta is None or not duration: return
+        meta["duration"] = duration
+        self._dirty = True
+
+    def protect(self, filepath):
+        # 最近播放/预加载的几个文件不参与淘汰
+        name = os.path.basename(filepath)
+        if name not in self.protected: self.protected.append(name)
+
+    def evict(self, keep=None):
+        for name in list(self.entries):
+            if self.total_bytes + self.part_bytes <= self.max_bytes: break
+            if name == keep or name in self.protected: continue
+            meta = self.entries.pop(name)
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # 文件被占用（Windows 下正在播放），放回队尾稍后再试
+                self.entries[name] = meta
+                continue
+            self.total_bytes -= meta.get("size", 0)
+            self.bytes_evicted += meta.get("size", 0)
+            self.files_evicted += 1
+            self._dirty = True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"files": len(self.entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "bytes_evicted": self.bytes_evicted, "files_evicted": self.files_evicted}
@@ -1,9 +1,19 @@
+import asyncio
 import json
 import os
 import re
-import httpx
+import shutil
+import urllib.parse
 import pygame
 
+from core.audio_cache import PART_META_SUFFIX, AudioCache
+from core.image_cache import ImageCache
+from core.library import SongIndex, plain_song
+from core.library_db import LocalLibrary
+from core.net import NetPool
+from core.probe import detect_format, probe_duration
+from core.store import UserDataStore
+
 class DataHelper:
     def __init__(self):
         self.config_file = "config.json"
@@ -17,8 +27,12 @@ class DataHelper:
             "kugou": ""
         }
         self.qq_uin = "0"
-        self.favorites = []
-        self.history = []
+        self.favorites = SongIndex()
+        self.history = SongIndex(limit=50)
+        self.options = {}
+        self.net = NetPool()
+        self.downloads = {}
+        self._inflight = {}
 
         # 初始化音频设备
         try:
@@ -28,7 +42,41 @@ class DataHelper:
             print(f"音频设备初始化警告: {e}")
 
         self.load_config()
+        # 收藏/历史的写入合并延迟 delay 秒；收藏很多时可开启 journal 只追加增量
+        store_options = self.options.get("userdata", {})
+        self.store = UserDataStore(self.data_file, self._userdata_snapshot,
+                                   delay=store_options.get("delay", 1.0),
+                                   journal=store_options.get("journal", False),
+                                   compact_every=store_options.get("compact_every", 500))
         self.load_userdata()
+        self.library = self._open_library(self.options.get("library", {}))
+        self.audio_cache = AudioCache("temp_cache", int(self.options.get("cache_limit_mb", 1024)) * 1024 * 1024,
+                                      part_max_age=float(self.options.get("cache_part_max_age_hours", 48)) * 3600)
+        # 封面/头像/搜图缩略图缓存，按 URL 只下载一次
+        image_options = self.options.get("image_cache", {})
+        self.images = ImageCache(self.net, image_options.get("folder", "image_cache"),
+                                 int(image_options.get("limit_mb", 200)) * 1024 * 1024)
+        # 边下边播：缓冲到该字节数即开始播放，0 表示下载完成后再播
+        self.stream_prefix = int(self.options.get("stream_prefix_kb", 384)) * 1024
+
+    def _open_library(self, options):
+        if not options.get("enabled", True): return None
+        try:
+            library = LocalLibrary(options.get("path", "library.db"))
+            if library.is_empty(): library.import_songs(self.favorites, self.history)
+            return library
+        except Exception as e:
+            print(f"本地曲库不可用: {e}")
+            return None
+
+    async def aclose(self):
+        await self.store.aclose()
+        if self.library: await asyncio.to_thread(self.library.close)
+        self.audio_cache.save()
+        stats = self.audio_cache.stats()
+        print(f"音频缓存: 命中率 {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}), "
+              f"已淘汰 {stats['files_evicted']} 个文件 / {stats['bytes_evicted'] / 1024 / 1024:.1f} MB")
+        await self.net.aclose()
 
     def load_config(self):
         if os.path.exists(self.config_file):
@@ -37,11 +85,14 @@ class DataHelper:
                     data = json.load(f)
                     self.cookies.update(data.get("cookies", {}))
                     self.qq_uin = data.get("qq_uin", "0")
+                    self.options = {k: v for k, v in data.items() if k not in ("cookies", "qq_uin")}
+                    self.net.configure(self.options.get("net", {}))
             except:
                 pass
 
     def save_config(self):
         data = {"cookies": self.cookies, "qq_uin": self.qq_uin}
+        data.update(self.options)
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=4)
@@ -49,51 +100,102 @@ class DataHelper:
             pass
 
     def load_userdata(self):
-        if os.path.exists(self.data_file):
+        data, ops = self.store.load()
+        if data:
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.favorites = data.get("favorites", [])
-                    self.history = data.get("history", [])
+                self.favorites = SongIndex(data.get("favorites", []))
+                self.history = SongIndex(data.get("history", []), limit=50)
             except:
                 pass
+        for op in ops:
+            self._apply(op)
 
-    def save_userdata(self):
-        data = {"favorites": self.favorites, "history": self.history}
-        try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except:
-            pass
+    def _apply(self, op):
+        kind, song = op.get("op"), op.get("song")
+        if not song: return
+        if kind == "favorite": self.favorites.push_front(song)
+        elif kind == "unfavorite": self.favorites.remove(song)
+        elif kind == "history": self.history.push_front(song)
+
+    def _userdata_snapshot(self):
+        # 在事件循环线程里复制一份，工作线程序列化时不会碰到正在被修改的字典
+        return {"favorites": [plain_song(s) for s in self.favorites],
+                "history": [plain_song(s) for s in self.history]}
+
+    def save_userdata(self, op=None):
+        self.store.record(op)
 
     def toggle_favorite(self, song):
-        found = False
-        for i, s in enumerate(self.favorites):
-            if s['id'] == song['id']:
-                self.favorites.pop(i)
-                found = True
-                break
+        found = self.favorites.remove(song) is not None
         if not found:
-            self.favorites.insert(0, song)
-        self.save_userdata()
+            self.favorites.push_front(song)
+            self.save_userdata({"op": "favorite", "song": plain_song(song)})
+        else:
+            self.save_userdata({"op": "unfavorite", "song": {"id": song['id']}})
+        if self.library: self.library.set_favorite(song, not found)
         return not found
 
     def is_favorite(self, song):
-        if not song: return False
-        for s in self.favorites:
-            if s['id'] == song['id']:
-                return True
-        return False
+        return song in self.favorites
 
     def add_history(self, song):
-        for i, s in enumerate(self.history):
-            if s['id'] == song['id']:
-                self.history.pop(i)
-                break
-        self.history.insert(0, song)
-        if len(self.history) > 50:
-            self.history.pop()
-        self.save_userdata()
+        self.history.push_front(song)
+        self.save_userdata({"op": "history", "song": plain_song(song)})
+        if self.library: self.library.record_play(song)
+
+    def remember_cache(self, song, path):
+        if self.library: self.library.record_cache(song, path)
+
+    def search_local(self, keyword, limit=50):
+        terms = keyword.lower().split()
+        if not terms: return []
+        if self.library:
+            results = self.library.search(keyword, limit)
+        else:
+            # 未启用曲库时只在收藏和历史里按子串查找
+            seen, results = set(), []
+            for song in list(self.favorites) + list(self.history):
+                text = f"{song.get('name', '')} {song.get('artist', '')}".lower()
+                if song.get('id') in seen or not all(t in text for t in terms): continue
+                seen.add(song.get('id'))
+                results.append(song)
+            results = results[:limit]
+        known = {os.path.abspath(p) for p in map(self.local_path, results) if p}
+        files = [f for f in self._search_files("downloads", terms) if os.path.abspath(f['path']) not in known]
+        return results + files[:max(0, limit - len(results))]
+
+    def _search_files(self, folder, terms):
+        # downloads 里的文件没有元数据，按文件名匹配，包装成来源为“本地”的歌曲
+        if not os.path.isdir(folder): return []
+        songs = []
+        with os.scandir(folder) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() not in (".mp3", ".m4a", ".flac", ".ogg") or not entry.is_file(): continue
+                if not all(t in stem.lower() for t in terms): continue
+                songs.append({"id": entry.name, "name": stem, "artist": "本地文件", "source": "本地",
+                              "pic": "", "url": "", "path": entry.path})
+        return songs
+
+    def local_path(self, song):
+        # 已缓存或已下载的歌曲返回本地文件路径，播放时不必再解析地址和下载
+        if not song: return None
+        path = song.get('path')
+        if path and os.path.exists(path): return path
+        if self.library:
+            path = self.library.cached_path(song)
+            if path: return path
+        for ext in ("mp3", "m4a"):
+            path = self.target_path("temp_cache", f"cache_{song['id']}.{ext}")
+            if os.path.exists(path) and os.path.getsize(path) > 100 * 1024: return path
+        return None
+
+    def open_local(self, song):
+        path = self.local_path(song)
+        if path and self.audio_cache.owns(os.path.dirname(path)):
+            self.audio_cache.hit(path)
+            self.audio_cache.protect(path)
+        return path
 
     def set_cookie(self, platform, cookie_str):
         if cookie_str:
@@ -124,28 +226,182 @@ class DataHelper:
             headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
         return headers
 
-    async def download_file(self, url, folder, filename):
-        if not os.path.exists(folder): os.makedirs(folder)
+    def target_path(self, folder, filename):
         safe_name = re.sub(r'[\\/*?:"<>|]', "", filename).strip()
-        filepath = os.path.join(folder, safe_name)
+        return os.path.join(folder, safe_name)
+
+    async def wait_buffered(self, task, filepath, min_bytes):
+        # 等到下载进度达到 min_bytes 返回 True；下载先结束或总长度未知（无法估算缓冲进度）则返回 False
+        while not task.done():
+            progress = self.downloads.get(filepath)
+            if progress and progress[1] and progress[0] >= min_bytes: return True
+            await asyncio.sleep(0.05)
+        return False
+
+    def probe_duration(self, filepath):
+        # 缓存目录内的文件把时长记在索引里，重启后重播也不必再解析
+        cached = self.audio_cache.owns(os.path.dirname(filepath))
+        duration = self.audio_cache.get_duration(filepath) if cached else None
+        if duration: return duration
+        duration = probe_duration(filepath)
+        if cached: self.audio_cache.set_duration(filepath, duration)
+        return duration
+
+    def cache_filename(self, song, url):
+        # 扩展名取自地址里的文件名（QQ 先试的 M500xxx.mp3 与 C400xxx.m4a 各用各的缓存名），取不到时再按地址猜
+        name = urllib.parse.urlparse(url).path.rsplit("/", 1)[-1]
+        ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+        if ext not in ("mp3", "m4a"): ext = "m4a" if "m4a" in url else "mp3"
+        return f"cache_{song['id']}.{ext}"
+
+    @staticmethod
+    def is_mp3(filepath):
+        # 按已下载部分的文件头判断，扩展名不可靠（旧缓存里 QQ 的 mp3 也记成了 .m4a）
+        try:
+            return detect_format(filepath) == "mp3"
+        except OSError:
+            return False
 
+    async def download_file(self, url, folder, filename, limiter=None):
+        if not os.path.exists(folder): os.makedirs(folder)
+        filepath = self.target_path(folder, filename)
+
+        cache = self.audio_cache if self.audio_cache.owns(folder) else None
         if os.path.exists(filepath) and os.path.getsize(filepath) > 100 * 1024:
+            # 边下边播时 Windows 上 .part 可能因被占用而无法删除，这里顺手清理
+            if os.path.exists(f"{filepath}.part"): self._drop_part(f"{filepath}.part")
+            if cache: cache.hit(filepath)
             return True, filepath
 
-        async with httpx.AsyncClient(follow_redirects=True, verify=False) as client:
-            try:
-                headers = self.base_headers.copy()
-                async with client.stream('GET', url, headers=headers) as resp:
-                    if resp.status_code != 200: return False, f"HTTP {resp.status_code}"
-                    with open(filepath, 'wb') as f:
-                        async for chunk in resp.aiter_bytes():
-                            f.write(chunk)
-                if os.path.getsize(filepath) < 100 * 1024:
-                    try:
-                        os.remove(filepath)
-                    except:
-                        pass
-                    return False, "无效文件"
-                return True, filepath
-            except Exception as e:
-                return False, str(e)
\ No newline at end of file
+        # 同一文件只保留一个下载任务，后来的调用方共享结果；不限速的调用方加入后解除限速
+        entry = self._inflight.get(filepath)
+        if entry is None:
+            if cache: cache.miss()
+            task = asyncio.ensure_future(self._download(url, filepath, cache))
+            entry = self._inflight[filepath] = {"task": task, "waiters": 0, "limiter": limiter}
+            task.add_done_callback(lambda t: self._forget_download(filepath, t))
+        elif limiter is None:
+            entry["limiter"] = None
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            # 最后一个等待者取消时才真正中止下载，已写入的 .part 留待续传
+            if entry["waiters"] == 1: entry["task"].cancel()
+            raise
+        finally:
+            entry["waiters"] -= 1
+
+    def _forget_download(self, filepath, task):
+        entry = self._inflight.get(filepath)
+        if entry and entry["task"] is task: del self._inflight[filepath]
+
+    async def _download(self, url, filepath, cache):
+        # 先写入 .part 临时文件，完整校验后再原子重命名；中断后用 Range 从已下载的偏移续传
+        part_path = f"{filepath}.part"
+        try:
+            headers = self.base_headers.copy()
+            source = self._source_name(url)
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if offset:
+                # .part 旁记录了它来自哪个文件：对不上（如 QQ 的 M500 换成 C400）或没有记录的不能续传
+                meta = self._read_part_meta(part_path)
+                if not meta or meta.get("source") != source:
+                    self._drop_part(part_path)
+                    offset = 0
+                else:
+                    headers["Range"] = f"bytes={offset}-"
+                    # 服务端文件已变化时 If-Range 会让它返回完整的 200 响应
+                    if meta.get("validator"): headers["If-Range"] = meta["validator"]
+            async with self.net.client.stream('GET', url, headers=headers, follow_redirects=True) as resp:
+                if resp.status_code == 416:
+                    self._drop_part(part_path)
+                    return False, "HTTP 416"
+                if resp.status_code not in (200, 206): return False, f"HTTP {resp.status_code}"
+                expected = self._expected_length(resp, offset)
+                if expected is False:
+                    self._drop_part(part_path)
+                    return False, "续传偏移不匹配"
+                if resp.status_code == 200:
+                    offset = 0
+                    self._write_part_meta(part_path, source, resp)
+                # 进度对外可见（已下载字节, 总字节），供边下边播判断缓冲量
+                progress = self.downloads[filepath] = [offset, expected]
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    async for chunk in resp.aiter_bytes():
+                        f.write(chunk)
+                        f.flush()
+                        progress[0] += len(chunk)
+                        entry = self._inflight.get(filepath)
+                        if entry and entry["limiter"]: await entry["limiter"].consume(len(chunk))
+            size = os.path.getsize(part_path)
+            if expected is not None and size != expected:
+                # 偏短的保留下来下次续传，偏长说明文件已损坏
+                if size > expected: self._drop_part(part_path)
+                return False, "下载不完整"
+            if size < 100 * 1024:
+                self._drop_part(part_path)
+                return False, "无效文件"
+            self._finalize(part_path, filepath)
+            if cache: cache.add(filepath)
+            return True, filepath
+        except Exception as e:
+            return False, str(e)
+        finally:
+            self.downloads.pop(filepath, None)
+
+    def _finalize(self, part_path, filepath):
+        try:
+            os.replace(part_path, filepath)
+        except PermissionError:
+            # Windows 下 .part 正被播放器读取时无法重命名，改为复制
+            shutil.copyfile(part_path, filepath)
+            self._remove_quietly(part_path)
+        self._remove_quietly(f"{part_path}{PART_META_SUFFIX}")
+
+    @staticmethod
+    def _source_name(url):
+        # 地址里的文件名（不含 vkey 等查询参数），同一首歌换了文件类型或码率时会不同
+        return urllib.parse.urlparse(url).path.rsplit("/", 1)[-1]
+
+    @staticmethod
+    def _read_part_meta(part_path):
+        try:
+            with open(f"{part_path}{PART_META_SUFFIX}", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            return None
+
+    @staticmethod
+    def _write_part_meta(part_path, source, resp):
+        # If-Range 只能用强 ETag，没有时退回 Last-Modified
+        etag = resp.headers.get("ETag", "")
+        validator = etag if etag and not etag.startswith("W/") else resp.headers.get("Last-Modified")
+        try:
+            with open(f"{part_path}{PART_META_SUFFIX}", 'w', encoding='utf-8') as f:
+                json.dump({"source": source, "validator": validator}, f)
+        except OSError:
+            pass
+
+    def _drop_part(self, part_path):
+        self._remove_quietly(part_path)
+        self._remove_quietly(f"{part_path}{PART_META_SUFFIX}")
+
+    @staticmethod
+    def _expected_length(resp, offset):
+        # 压缩传输时解码后的长度与 Content-Length 不一致，无法校验
+        if resp.headers.get("Content-Encoding", "identity") != "identity": return None
+        if resp.status_code == 206:
+            content_range = resp.headers.get("Content-Range", "")
+            match = re.match(r"bytes (\d+)-\d+/(\d+)", content_range)
+            if not match or int(match.group(1)) != offset: return False
+            return int(match.group(2))
+        length = resp.headers.get("Content-Length")
+        return int(length) if length and length.isdigit() else None
+
+    @staticmethod
+    def _remove_quietly(path):
+        try:
+            os.remove(path)
+        except:
+            pass
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# 缩略图规格（像素，取长边）：列表行 50，全屏封面/图片网格 300
+VARIANTS = {"thumb": 50, "cover": 300}
+
+
+# 封面/头像/搜图缩略图的本地缓存：每个 URL 只下载一次，按 URL 哈希生成各规格缩略图，
+# 目录总大小超过上限时淘汰最久未用的文件。没装 Pillow 时原图直接落盘，各规格共用
+class ImageCache:
+    def __init__(self, net, folder="image_cache", max_bytes=200 * 1024 * 1024, max_concurrent=4):
+        self.net = net
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_concurrent = max_concurrent
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self._inflight = {}
+        self._sem = None
+        self.load()
+        self.evict()
+
+    def load(self):
+        if not os.path.exists(self.folder): return
+        rows = []
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp") or not entry.is_file(): continue
+                st = entry.stat()
+                rows.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(rows):
+            self.entries[name] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _name(self, url, variant):
+        return f"{self._key(url)}_{VARIANTS[variant]}.jpg" if Image else f"{self._key(url)}.img"
+
+    def cached(self, url, variant="thumb"):
+        # 只查本地，不发请求；命中时刷新淘汰顺序
+        if not url: return None
+        name = self._name(url, variant)
+        if name not in self.entries: return None
+        path = os.path.join(self.folder, name)
+        if not os.path.exists(path):
+            self.total_bytes -= self.entries.pop(name)
+            return None
+        self.entries.move_to_end(name)
+        return os.path.abspath(path)
+
+    async def get(self, url, variant="thumb"):
+        # 返回本地文件的绝对路径，下载或解码失败返回 None；同一 URL 的并发请求合并为一次下载
+        if not url or not url.startswith("http"): return None
+        path = self.cached(url, variant)
+        if path: return path
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        if not await asyncio.shield(task): return None
+        return self.cached(url, variant)
+
+    async def _fetch(self, url):
+        if self._sem is None: self._sem = asyncio.Semaphore(self.max_concurrent)
+        async with self._sem:
+            try:
+                resp = await self.net.client.get(url, timeout=10, follow_redirects=True)
+                if resp.status_code != 200 or not resp.content: return False
+                files = await asyncio.to_thread(self._store, url, resp.content)
+            except Exception as e:
+                print(f"图片缓存失败: {e}")
+                return False
+        for name, size in files:
+            old = self.entries.pop(name, None)
+            if old: self.total_bytes -= old
+            self.entries[name] = size
+            self.total_bytes += size
+        self.evict()
+        return bool(files)
+
+    def _store(self, url, data):
+        # 在工作线程里解码缩放；每个规格写临时文件再原子替换
+        if not os.path.exists(self.folder): os.makedirs(self.folder, exist_ok=True)
+        outputs = []
+        if Image is None:
+            outputs.append((self._name(url, "thumb"), data))
+        else:
+            img = Image.open(io.BytesIO(data))
+            img.draft("RGB", (max(VARIANTS.values()),) * 2)
+            img = img.convert("RGB")
+            for variant, size in VARIANTS.items():
+                copy = img.copy()
+                copy.thumbnail((size, size))
+                buf = io.BytesIO()
+                copy.save(buf, "JPEG", quality=85)
+                outputs.append((self._name(url, variant), buf.getvalue()))
+        files = []
+        for name, blob in outputs:
+            path = os.path.join(self.folder, name)
+            with open(f"{path}.tmp", 'wb') as f:
+                f.write(blob)
+            os.replace(f"{path}.tmp", path)
+            files.append((name, len(blob)))
+        return files
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
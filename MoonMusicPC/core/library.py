@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from itertools import islice
+
+# 只在内存里使用的字段（如搜索合并出的备用来源），不写入 userdata.json 和曲库
+TRANSIENT_KEYS = ("alternates",)
+
+
+def plain_song(song):
+    return {k: v for k, v in song.items() if k not in TRANSIENT_KEYS}
+
+
+# 收藏/历史的有序集合：按歌曲 id 建索引，最新的排在最前；迭代、len、切片的用法与原来的列表一致
+class SongIndex:
+    def __init__(self, songs=None, limit=None):
+        self.limit = limit
+        self._items = OrderedDict()
+        # 旧数据里可能有重复 id，保留靠前（较新）的那条
+        for song in songs or []:
+            key = self._key(song)
+            if key not in self._items: self._items[key] = song
+        self._trim()
+
+    @staticmethod
+    def _key(song):
+        return song.get('id')
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __contains__(self, song):
+        return bool(song) and self._key(song) in self._items
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if (i.start or 0) >= 0 and (i.stop is None or i.stop >= 0) and i.step in (None, 1):
+                return list(islice(self._items.values(), i.start, i.stop))
+            return self.to_list()[i]
+        if 0 <= i < len(self._items): return next(islice(self._items.values(), i, None))
+        return self.to_list()[i]
+
+    def get(self, song_id):
+        return self._items.get(song_id)
+
+    def push_front(self, song):
+        key = self._key(song)
+        self._items[key] = song
+        self._items.move_to_end(key, last=False)
+        self._trim()
+
+    def remove(self, song):
+        return self._items.pop(self._key(song), None)
+
+    def to_list(self):
+        return list(self._items.values())
+
+    def _trim(self):
+        if self.limit is None: return
+        while len(self._items) > self.limit:
+            self._items.popitem(last=True)
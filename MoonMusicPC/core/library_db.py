@@ -0,0 +1,172 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.library import plain_song
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    key TEXT PRIMARY KEY, name TEXT, artist TEXT, source TEXT, data TEXT,
+    play_count INTEGER DEFAULT 0, last_played REAL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS plays (id INTEGER PRIMARY KEY, key TEXT, played_at REAL);
+CREATE TABLE IF NOT EXISTS favorites (key TEXT PRIMARY KEY, added_at REAL);
+CREATE TABLE IF NOT EXISTS cache_files (key TEXT PRIMARY KEY, path TEXT, updated_at REAL);
+"""
+
+# 外部内容表：全文索引只存 name/artist，由触发器与 songs 保持同步
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(name, artist, content='songs', content_rowid='rowid', tokenize='{tokenizer}');
+CREATE TRIGGER IF NOT EXISTS songs_ai AFTER INSERT ON songs BEGIN
+    INSERT INTO songs_fts(rowid, name, artist) VALUES (new.rowid, new.name, new.artist);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_ad AFTER DELETE ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, name, artist) VALUES ('delete', old.rowid, old.name, old.artist);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_au AFTER UPDATE OF name, artist ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, name, artist) VALUES ('delete', old.rowid, old.name, old.artist);
+    INSERT INTO songs_fts(rowid, name, artist) VALUES (new.rowid, new.name, new.artist);
+END;
+"""
+
+ORDER = "ORDER BY (f.key IS NOT NULL) DESC, s.play_count DESC, s.last_played DESC"
+
+
+def song_key(song):
+    return f"{song.get('source')}:{song.get('id')}"
+
+
+# 本地曲库：记录播放过/收藏过的歌曲、播放事件和缓存文件，支持按歌名/歌手即时搜索。
+# 中文没有空格分词，优先用 trigram 分词器做子串匹配；不足三个字的词或不支持 FTS5 时退回 LIKE。
+# 播放/收藏/缓存记录交给单独的写线程按顺序执行，事务不占用事件循环；查询仍在调用方线程用读连接
+class LocalLibrary:
+    def __init__(self, path="library.db"):
+        if sqlite3 is None: raise RuntimeError("sqlite3 不可用")
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.tokenizer = None
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self.conn.executescript(FTS_SCHEMA.format(tokenizer=tokenizer))
+                self.tokenizer = tokenizer
+                break
+            except sqlite3.OperationalError:
+                continue
+        self.conn.commit()
+        # 写连接只在写线程里使用；WAL 模式下读连接不会被写事务阻塞
+        self.writer = sqlite3.connect(path, check_same_thread=False)
+        self.writer.execute("PRAGMA synchronous=NORMAL")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library")
+
+    def close(self):
+        # 等排队中的写入执行完再关闭连接
+        self._executor.shutdown(wait=True)
+        for conn in (self.writer, self.conn):
+            try:
+                conn.close()
+            except:
+                pass
+
+    def _submit(self, fn, song, *args):
+        # 先复制一份歌曲字典，写线程执行时调用方可能已经改动了原字典
+        try:
+            future = self._executor.submit(fn, plain_song(song), *args)
+        except RuntimeError:
+            return None  # 已关闭，退出过程中的迟到写入直接丢弃
+        future.add_done_callback(self._report)
+        return future
+
+    @staticmethod
+    def _report(future):
+        e = future.exception()
+        if e: print(f"本地曲库写入失败: {e}")
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM songs LIMIT 1").fetchone() is None
+
+    @staticmethod
+    def _upsert(conn, song):
+        conn.execute(
+            "INSERT INTO songs(key, name, artist, source, data) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET name=excluded.name, artist=excluded.artist, data=excluded.data",
+            (song_key(song), song.get('name', ''), song.get('artist', ''), song.get('source', ''),
+             json.dumps(plain_song(song), ensure_ascii=False)))
+
+    def import_songs(self, favorites, history):
+        # 首次启用时把 userdata.json 里的收藏和历史导入，历史按从旧到新的顺序写入
+        now = time.time()
+        with self.conn:
+            for i, song in enumerate(reversed(list(history))):
+                self._upsert(self.conn, song)
+                self.conn.execute("UPDATE songs SET play_count = play_count + 1, last_played = ? WHERE key = ?",
+                                  (now - len(history) + i, song_key(song)))
+            for i, song in enumerate(reversed(list(favorites))):
+                self._upsert(self.conn, song)
+                self.conn.execute("INSERT OR IGNORE INTO favorites(key, added_at) VALUES (?, ?)",
+                                  (song_key(song), now - len(favorites) + i))
+
+    def record_play(self, song):
+        return self._submit(self._record_play, song, time.time())
+
+    def set_favorite(self, song, on):
+        return self._submit(self._set_favorite, song, on, time.time())
+
+    def record_cache(self, song, path):
+        return self._submit(self._record_cache, song, path, time.time())
+
+    def _record_play(self, song, now):
+        key = song_key(song)
+        with self.writer:
+            self._upsert(self.writer, song)
+            self.writer.execute("UPDATE songs SET play_count = play_count + 1, last_played = ? WHERE key = ?", (now, key))
+            self.writer.execute("INSERT INTO plays(key, played_at) VALUES (?, ?)", (key, now))
+
+    def _set_favorite(self, song, on, now):
+        with self.writer:
+            if on:
+                self._upsert(self.writer, song)
+                self.writer.execute("INSERT OR REPLACE INTO favorites(key, added_at) VALUES (?, ?)",
+                                    (song_key(song), now))
+            else:
+                self.writer.execute("DELETE FROM favorites WHERE key = ?", (song_key(song),))
+
+    def _record_cache(self, song, path, now):
+        with self.writer:
+            self._upsert(self.writer, song)
+            self.writer.execute("INSERT OR REPLACE INTO cache_files(key, path, updated_at) VALUES (?, ?, ?)",
+                                (song_key(song), path, now))
+
+    def cached_path(self, song):
+        row = self.conn.execute("SELECT path FROM cache_files WHERE key = ?", (song_key(song),)).fetchone()
+        return row[0] if row and os.path.exists(row[0]) else None
+
+    def search(self, keyword, limit=50):
+        terms = [t for t in (keyword or "").split() if t]
+        if not terms: return []
+        base = "SELECT s.data FROM songs s LEFT JOIN favorites f ON f.key = s.key "
+        if (self.tokenizer == "trigram" and all(len(t) >= 3 for t in terms)) or self.tokenizer == "unicode61":
+            # 每个词加引号按短语匹配，避免用户输入被当作 FTS 语法
+            query = " ".join('"' + t.replace('"', '""') + '"' + ("*" if self.tokenizer == "unicode61" else "")
+                             for t in terms)
+            sql = base + f"WHERE s.rowid IN (SELECT rowid FROM songs_fts WHERE songs_fts MATCH ?) {ORDER} LIMIT ?"
+            params = [query, limit]
+        else:
+            clauses = " AND ".join("(s.name || ' ' || s.artist) LIKE ? ESCAPE '\\'" for _ in terms)
+            sql = base + f"WHERE {clauses} {ORDER} LIMIT ?"
+            params = ["%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for t in terms]
+            params.append(limit)
+        try:
+            rows = self.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"本地曲库搜索失败: {e}")
+            return []
+        return [json.loads(r[0]) for r in rows]
@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+
+# h2 是可选依赖，缺失时退回 HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 应用级共享的 httpx 连接池，所有爬虫与下载请求复用同一个 AsyncClient
+class NetPool:
+    def __init__(self, max_connections=32, max_keepalive=16, keepalive_expiry=30.0, timeout=5.0, http2=True):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._client = None
+
+    def configure(self, options):
+        # 连接池参数只在客户端创建前生效
+        for key in ("max_connections", "max_keepalive", "keepalive_expiry", "timeout"):
+            if key in options:
+                setattr(self, key, options[key])
+        if "http2" in options:
+            self.http2 = bool(options["http2"]) and HTTP2_AVAILABLE
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_keepalive,
+                                  keepalive_expiry=self.keepalive_expiry)
+            self._client = httpx.AsyncClient(verify=False, http2=self.http2, limits=limits, timeout=self.timeout)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+# 令牌桶限速，多个下载共享同一个实例即为全局带宽上限
+class RateLimiter:
+    def __init__(self, bytes_per_sec):
+        self.rate = bytes_per_sec
+        self._allowance = bytes_per_sec
+        self._last = None
+
+    async def consume(self, nbytes):
+        if not self.rate: return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._last is not None:
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+        self._last = now
+        self._allowance -= nbytes
+        if self._allowance < 0:
+            await asyncio.sleep(-self._allowance / self.rate)
@@ -4,7 +4,14 @@ import time
 import uuid
 import pygame
 import flet as ft
-from mutagen.mp3 import MP3
+
+from core.probe import probe
+
+# 无缝衔接时提前多少秒把下一首排进 music 队列
+QUEUE_LEAD = 5.0
+# 边下边播：在解码器读到加载时的数据末尾前多少秒重新加载；重载后至少要多出多少秒可播放才值得重载
+STREAM_RELOAD_LEAD = 1.5
+STREAM_MIN_AHEAD = 5.0
 
 
 class PlayerManager:
@@ -16,6 +23,8 @@ class PlayerManager:
         self.current_index = -1
         self.auto_play = False
         self.on_auto_play_callback = None
+        self.on_playlist_callback = None
+        self.on_track_changed_callback = None
         self.page = None
 
         # UI 组件引用
@@ -29,6 +38,45 @@ class PlayerManager:
         self.start_time_offset = 0
         self.current_play_token = None
         self.play_start_time = 0
+        self.position = 0
+        self.current_path = None
+
+        # 边下边播状态：stream_path 指向正在写入的 .part，stream_progress() 返回 (已下载, 总字节)，下载结束后返回 None
+        self.stream_path = None
+        self.stream_progress = None
+        self.buffering = False
+        # SDL_mixer 在 load 时就定下 MP3 的长度：stream_limit 是按加载时的文件大小估算的可播放秒数，
+        # 当前加载的不是 .part 或无法估算时为 None；stream_rate/stream_offset 为每秒字节数和 ID3 头大小
+        self.stream_limit = None
+        self.stream_rate = 0
+        self.stream_offset = 0
+
+        # 刷新频率随界面状态调整：全屏播放器可见时最快，窗口失焦时最慢
+        self.full_visible = False
+        self.window_focused = True
+
+        # 自动播放的衔接：下一首预取完成后登记到 next_track。crossfade 为 0 时用 music.queue 无缝排队；
+        # 否则提前把下一首解码成 Sound 放在副播放槽，末尾交叉淡化后由副播放槽继续播放，拖动进度时再交回 music
+        self.gapless = True
+        self.crossfade = 0
+        self.next_track = None
+        # 边下边播期间送来的下一首先记在这里，下载完成换成正式文件后再登记
+        self.deferred_next = None
+        self.deck = "music"
+        self.channel = None
+        self.deck_started_at = 0
+        self.paused_at = 0
+        self._decode_task = None
+        self._fade_task = None
+
+        # 播放结束事件依赖 pygame 事件队列（display 子系统），不可用时退回 get_busy 轮询
+        self.end_event = None
+        try:
+            if not pygame.display.get_init(): pygame.display.init()
+            pygame.mixer.music.set_endevent(pygame.USEREVENT + 1)
+            self.end_event = pygame.USEREVENT + 1
+        except Exception as e:
+            print(f"播放结束事件不可用，改用轮询: {e}")
 
     def register_ui(self, page, mini_slider, full_slider, mini_time, full_time):
         self.page = page
@@ -40,9 +88,27 @@ class PlayerManager:
     def set_callback(self, callback):
         self.on_auto_play_callback = callback
 
+    def set_view_state(self, full_visible=None, focused=None):
+        if full_visible is not None: self.full_visible = full_visible
+        if focused is not None: self.window_focused = focused
+
+    def set_playlist_callback(self, callback):
+        self.on_playlist_callback = callback
+
+    def set_track_changed_callback(self, callback):
+        self.on_track_changed_callback = callback
+
+    def set_transition(self, gapless=True, crossfade=0):
+        self.gapless = gapless
+        self.crossfade = max(0, crossfade)
+
     def set_playlist(self, songs, start_index):
+        changed = songs is not self.playlist
         self.playlist = songs
         self.current_index = start_index
+        # 新列表交给回调在后台预解析播放地址
+        if changed and songs and self.on_playlist_callback:
+            self.on_playlist_callback(songs, start_index)
 
     def get_current_song(self):
         if 0 <= self.current_index < len(self.playlist):
@@ -64,36 +130,90 @@ class PlayerManager:
         self.current_index = (self.current_index - 1 + len(self.playlist)) % len(self.playlist)
         return self.playlist[self.current_index]
 
-    def load_and_play(self, filepath, duration=180):
+    def prepare_next(self, song, filepath, duration=None):
+        # 只接受当前曲目之后的那一首；新的登记会替换旧的
+        if not self.gapless or song is not self.get_next_song(): return
+        if self.stream_path:
+            self.deferred_next = (song, filepath, duration)
+            return
+        if self.next_track and self.next_track["song"] is song: return
+        self._drop_next()
+        track = {"song": song, "path": filepath, "duration": duration, "sound": None, "queued": False}
+        self.next_track = track
+        if self.crossfade > 0:
+            self._decode_task = asyncio.create_task(self._decode_next(track))
+
+    async def _decode_next(self, track):
+        # 整首解码到内存（4 分钟约 40MB），放到线程里避免卡住界面
+        try:
+            sound = await asyncio.to_thread(pygame.mixer.Sound, track["path"])
+        except Exception as e:
+            print(f"预解码失败，改用无缝排队: {e}")
+            sound = False
+        if self.next_track is track: track["sound"] = sound
+
+    def _drop_next(self):
+        if self._decode_task: self._decode_task.cancel()
+        self._decode_task = None
+        self.next_track = None
+
+    def _reset_decks(self):
+        self._drop_next()
+        self.deferred_next = None
+        if self._fade_task: self._fade_task.cancel()
+        self._fade_task = None
+        if self.channel:
+            try:
+                self.channel.stop()
+            except:
+                pass
+        self.channel = None
+        self.deck = "music"
+        try:
+            pygame.mixer.music.set_volume(1.0)
+        except:
+            pass
+
+    def load_and_play(self, filepath, duration=None, stream_progress=None):
         new_token = str(uuid.uuid4())
         self.current_play_token = new_token
 
         if self.monitor_task: self.monitor_task.cancel()
         if not os.path.exists(filepath): return False
 
-        try:
-            try:
-                audio = MP3(filepath)
-                self.duration = audio.info.length
-            except:
-                self.duration = duration
-        except:
-            self.duration = duration
+        self._reset_decks()
+        self.current_path = filepath
+        self.stream_path = filepath if stream_progress else None
+        self.stream_progress = stream_progress
+        self.buffering = False
+
+        info = None if duration else probe(filepath)
+        self.duration = duration or (info and info["duration"]) or 180
+        # 未下载完的文件按码率和总大小估算时长
+        progress = stream_progress() if stream_progress else None
+        if info and progress and progress[1] and info["bitrate"]:
+            self.duration = progress[1] * 8 / info["bitrate"]
+        self.stream_rate = info["bitrate"] / 8 if info and info["bitrate"] else 0
+        self.stream_offset = info.get("offset", 0) if info else 0
+        self.stream_limit = self._bytes_to_seconds(os.path.getsize(filepath)) if self._partial(filepath) else None
 
         for slider in [self.mini_slider, self.full_slider]:
             if slider:
                 slider.max = self.duration
                 slider.value = 0
+                slider.secondary_track_value = self._buffered_seconds()
                 slider.disabled = False
 
         try:
             if pygame.mixer.music.get_busy(): pygame.mixer.music.stop()
             pygame.mixer.music.load(filepath)
             pygame.mixer.music.play()
+            self._clear_end_events()
 
             self.is_playing = True
             self.paused = False
             self.start_time_offset = 0
+            self.position = 0
             self.play_start_time = time.time()
 
             self.monitor_task = asyncio.create_task(self._progress_loop(new_token))
@@ -103,6 +223,87 @@ class PlayerManager:
             self.is_playing = False
             return False
 
+    def _buffered_seconds(self):
+        if not self.stream_progress: return self.duration
+        progress = self.stream_progress()
+        if progress is None or not progress[1]: return self.duration
+        return min(self.duration, self.duration * progress[0] / progress[1])
+
+    @staticmethod
+    def _partial(path):
+        return bool(path) and path.endswith(".part")
+
+    def _bytes_to_seconds(self, nbytes):
+        if not self.stream_rate: return None
+        return max(0, (nbytes - self.stream_offset) / self.stream_rate)
+
+    def _latest_stream(self):
+        # 当前曲目可加载的最新数据 (路径, 可播放秒数)：下载已完成时换成正式文件（秒数为 None），
+        # 下载失败且没有正式文件时返回 None
+        path = self.current_path
+        final_path = path[:-len(".part")]
+        progress = self.stream_progress() if self.stream_progress else None
+        if progress is None:
+            if os.path.exists(final_path): return final_path, None
+            return None
+        return path, self._bytes_to_seconds(os.path.getsize(path))
+
+    def _reload_stream(self, position):
+        # 用最新数据重新加载并从 position 继续；返回 "ok"、"wait"（新数据不够，稍后再试）或 "fail"
+        latest = self._latest_stream()
+        if latest is None: return "fail"
+        path, limit = latest
+        if self._partial(path):
+            ahead = limit if limit is not None else self._buffered_seconds()
+            if ahead < min(position + STREAM_MIN_AHEAD, self.duration - 1): return "wait"
+        try:
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.play(start=position)
+        except Exception as e:
+            print(f"断点续播失败: {e}")
+            return "fail"
+        self._clear_end_events()
+        self._use_stream(path, limit)
+        self.start_time_offset = position
+        self.position = position
+        return "ok"
+
+    def _use_stream(self, path, limit):
+        self.current_path = path
+        self.stream_limit = limit
+        if not self._partial(path):
+            self.stream_path = None
+            self.stream_progress = None
+
+    def _finish_stream(self):
+        # 后台下载完成后换成正式文件续播，此后不再有加载长度的限制，可以开始准备无缝衔接
+        if not self.stream_path or self.stream_progress() is not None or self.deck != "music": return
+        position = self._deck_position()
+        if position is None: return
+        if self._reload_stream(position) == "fail":
+            # 下载失败：不再跟踪进度，播到已下载的末尾为止
+            self.stream_path = None
+            self.stream_progress = None
+            self.stream_limit = None
+            return
+        deferred, self.deferred_next = self.deferred_next, None
+        if deferred: self.prepare_next(*deferred)
+
+    def _extend_stream(self):
+        # 播放接近加载时的数据末尾前提前重载，按 get_pos 的实际位置续播，避免解码器停下后的静音和重复
+        if self.deck != "music" or self.buffering or self.stream_limit is None: return
+        if self.stream_limit - self.position > STREAM_RELOAD_LEAD: return
+        position = self._deck_position()
+        if position is not None: self._reload_stream(position)
+
+    def _recover_underrun(self):
+        # 缓冲没跟上时解码器会在数据末尾停下，等缓冲足够后从停下的位置重新加载
+        if self.deck != "music" or not self._partial(self.current_path) or self.position >= self.duration - 2:
+            return False
+        state = self._reload_stream(self.position)
+        self.buffering = state == "wait"
+        return state != "fail"
+
     async def _progress_loop(self, my_token):
         is_started = False
         for _ in range(20):
@@ -124,40 +325,177 @@ class PlayerManager:
         while self.is_playing:
             if self.current_play_token != my_token: return
             if self.paused:
-                await asyncio.sleep(0.5)
+                await asyncio.sleep(self._tick_interval())
                 continue
 
-            if not pygame.mixer.music.get_busy() and not self.is_dragging:
-                await asyncio.sleep(0.5)
-                if not pygame.mixer.music.get_busy():
-                    if self.current_play_token != my_token: return
-                    self.is_playing = False
-                    played_time = time.time() - self.play_start_time
-
-                    if self.auto_play and self.on_auto_play_callback:
-                        if played_time < 5.0: await asyncio.sleep(3.0)
-                        if self.current_play_token == my_token:
-                            await self.on_auto_play_callback()
-                    break
+            state = None if self.is_dragging else await self._poll_end()
+            if self.current_play_token != my_token: return
+            if state == "next":
+                # music 队列里的下一首已经开始；期间列表被改动或关闭了自动播放则停下，走普通流程
+                track = self.next_track
+                if self.auto_play and track and track["song"] is self.get_next_song():
+                    self._advance(track)
+                    continue
+                pygame.mixer.music.stop()
+                self._clear_end_events()
+                state = "ended"
 
-            if not self.is_dragging and pygame.mixer.music.get_busy():
+            if state == "ended":
+                if self._recover_underrun():
+                    # 等待缓冲时 _poll_end 会立即返回，这里按周期等待，避免空转
+                    if self.buffering: await asyncio.sleep(self._tick_interval())
+                    continue
+                self.is_playing = False
+                played_time = time.time() - self.play_start_time
+
+                if self.auto_play and self.on_auto_play_callback:
+                    if played_time < 5.0: await asyncio.sleep(3.0)
+                    if self.current_play_token == my_token:
+                        await self.on_auto_play_callback()
+                break
+
+            if not self.is_dragging:
                 try:
-                    current_pos_ms = pygame.mixer.music.get_pos()
-                    if current_pos_ms != -1:
-                        current_seconds = (current_pos_ms / 1000) + self.start_time_offset
+                    current_seconds = self._deck_position()
+                    if current_seconds is not None:
                         if current_seconds > self.duration: current_seconds = self.duration
-                        time_str = self._fmt_time(current_seconds)
-                        if self.mini_slider: self.mini_slider.value = current_seconds
-                        if self.full_slider: self.full_slider.value = current_seconds
-                        if self.mini_time: self.mini_time.value = time_str
-                        if self.full_time: self.full_time.value = time_str
-                        try:
-                            self.page.update()
-                        except:
-                            pass
+                        self.position = current_seconds
+                        self._push_progress(current_seconds)
                 except:
                     break
-            await asyncio.sleep(0.5)
+                self._finish_stream()
+                self._extend_stream()
+                self._prepare_transition()
+            await asyncio.sleep(self._tick_interval())
+
+    def _tick_interval(self):
+        tick = 2.0 if not self.window_focused else 0.5 if self.full_visible else 1.0
+        # 边下边播临近重载点时缩短间隔，既能准时重载，没赶上时记录的停止位置也更准
+        if self.stream_limit is not None and self.deck == "music" and not self.buffering:
+            tick = min(tick, max(0.05, self.stream_limit - STREAM_RELOAD_LEAD - self.position))
+        # 临近淡化起点/队列切换点时缩短间隔，保证准时开始并及时刷新界面
+        track = self.next_track
+        if track and not self.stream_path and (track["sound"] or track["queued"]):
+            lead = self.duration - self.position - (self.crossfade if track["sound"] else 0)
+            if lead > 0: tick = min(tick, max(0.05, lead))
+        return tick
+
+    def _deck_position(self):
+        if self.deck == "sound":
+            now = self.paused_at if self.paused else time.time()
+            return self.start_time_offset + now - self.deck_started_at
+        current_pos_ms = pygame.mixer.music.get_pos()
+        if current_pos_ms == -1: return None
+        return (current_pos_ms / 1000) + self.start_time_offset
+
+    def _prepare_transition(self):
+        track = self.next_track
+        if not track or not self.auto_play or self.stream_path or track["song"] is not self.get_next_song(): return
+        remaining = self.duration - self.position
+        # 解码失败（sound 为 False）时退回无缝排队
+        if self.crossfade > 0 and track["sound"] is not False:
+            if track["sound"] and remaining <= self.crossfade: self._start_crossfade(track)
+            return
+        if self.deck == "music" and not track["queued"] and self.end_event is not None and remaining <= QUEUE_LEAD:
+            # 队列切换只能靠结束事件识别，轮询模式下不排队
+            try:
+                pygame.mixer.music.queue(track["path"])
+                track["queued"] = True
+            except Exception as e:
+                print(f"无缝排队失败: {e}")
+                self.next_track = None
+
+    def _start_crossfade(self, track):
+        fade_ms = int(self.crossfade * 1000)
+        try:
+            channel = track["sound"].play(fade_ms=fade_ms)
+        except Exception as e:
+            print(f"交叉淡化失败: {e}")
+            channel = None
+        if channel is None:
+            track["sound"] = False
+            return
+        if self.deck == "sound" and self.channel:
+            self.channel.fadeout(fade_ms)
+        else:
+            # music.fadeout 会阻塞到淡出结束，这里逐步调音量
+            self._fade_task = asyncio.create_task(self._fade_out_music(self.crossfade))
+        self.deck = "sound"
+        self.channel = channel
+        self.deck_started_at = time.time()
+        self._advance(track)
+
+    async def _fade_out_music(self, seconds):
+        steps = max(1, int(seconds * 20))
+        try:
+            for i in range(steps):
+                pygame.mixer.music.set_volume(1 - (i + 1) / steps)
+                await asyncio.sleep(seconds / steps)
+            pygame.mixer.music.stop()
+            self._clear_end_events()
+        finally:
+            pygame.mixer.music.set_volume(1.0)
+
+    def _advance(self, track):
+        self.move_next()
+        self.next_track = None
+        self._decode_task = None
+        self.current_path = track["path"]
+        self.stream_limit = None
+        info = None if track["duration"] else probe(track["path"])
+        self.duration = track["duration"] or (info and info["duration"]) or 180
+        self.start_time_offset = 0
+        self.position = 0
+        self.play_start_time = time.time()
+        for slider in [self.mini_slider, self.full_slider]:
+            if slider:
+                slider.max = self.duration
+                slider.value = 0
+                slider.secondary_track_value = self.duration
+        if self.on_track_changed_callback: self.on_track_changed_callback(track["song"], track["path"])
+
+    def _clear_end_events(self):
+        if self.end_event is None: return
+        try:
+            pygame.event.clear(self.end_event, pump=False)
+        except:
+            pass
+
+    async def _poll_end(self):
+        # 返回 None（仍在播放）、"ended"（播放结束）或 "next"（music 队列里的下一首已开始）
+        # 等待缓冲时每个周期都重试续播
+        if self.buffering: return "ended"
+        if self.deck == "sound":
+            return None if self.channel and self.channel.get_busy() else "ended"
+        if self.end_event is not None:
+            try:
+                # 结束事件由音频线程投递，无需 pump；再用 get_busy 排除 stop/seek 残留的事件
+                if not pygame.event.get(self.end_event, pump=False): return None
+                if not pygame.mixer.music.get_busy(): return "ended"
+                return "next" if self.next_track and self.next_track["queued"] else None
+            except:
+                self.end_event = None
+        if pygame.mixer.music.get_busy(): return None
+        await asyncio.sleep(0.5)
+        return None if pygame.mixer.music.get_busy() else "ended"
+
+    def _push_progress(self, seconds):
+        # 只推送进度相关的控件，避免每个周期整页序列化；隐藏的全屏播放器只改值不推送
+        time_str = self._fmt_time(seconds)
+        buffered = self._buffered_seconds()
+        for slider, label, visible in [(self.mini_slider, self.mini_time, True),
+                                       (self.full_slider, self.full_time, self.full_visible)]:
+            if slider:
+                slider.value = seconds
+                slider.secondary_track_value = buffered
+            if label: label.value = time_str
+            if not visible: continue
+            for control in (slider, label):
+                if control is None: continue
+                try:
+                    control.update()
+                except:
+                    pass
 
     def _fmt_time(self, seconds):
         mins = int(seconds // 60)
@@ -167,20 +505,47 @@ class PlayerManager:
         return f"{mins:02}:{secs:02} / {total_mins:02}:{total_secs:02}"
 
     def seek(self, seconds):
+        # 边下边播时不能跳到尚未下载的位置
+        if self.stream_path: seconds = min(seconds, max(0, self._buffered_seconds() - 2))
         try:
+            if self.deck == "sound":
+                # 副播放槽不支持定位，交回 music 从目标位置播放
+                if self._fade_task: self._fade_task.cancel()
+                pygame.mixer.music.load(self.current_path)
+                pygame.mixer.music.set_volume(1.0)
+                if self.channel: self.channel.stop()
+                self.channel = None
+                self.deck = "music"
+                if self.paused: pygame.mixer.unpause()
+            elif self._partial(self.current_path):
+                # 加载时的长度不包含之后下载的部分，先换成最新数据再定位
+                latest = self._latest_stream()
+                if latest:
+                    pygame.mixer.music.load(latest[0])
+                    self._use_stream(*latest)
             pygame.mixer.music.play(start=seconds)
+            self._clear_end_events()
             self.start_time_offset = seconds
+            self.position = seconds
             self.paused = False
         except:
             pass
 
     def pause_resume(self, icon_controls):
-        if pygame.mixer.music.get_busy():
+        if self.deck == "sound":
+            playing = not self.paused and self.channel is not None and self.channel.get_busy()
+        else:
+            playing = pygame.mixer.music.get_busy()
+        if playing:
             pygame.mixer.music.pause()
+            pygame.mixer.pause()
             self.paused = True
+            self.paused_at = time.time()
             for icon in icon_controls: icon.icon = ft.Icons.PLAY_CIRCLE_FILLED
         else:
             pygame.mixer.music.unpause()
+            pygame.mixer.unpause()
+            if self.deck == "sound" and self.paused: self.deck_started_at += time.time() - self.paused_at
             self.paused = False
             self.is_playing = True
             for icon in icon_controls: icon.icon = ft.Icons.PAUSE_CIRCLE_FILLED
@@ -190,9 +555,15 @@ class PlayerManager:
 
     def stop(self):
         self.current_play_token = None
+        self.stream_path = None
+        self.stream_progress = None
+        self.stream_limit = None
+        self.buffering = False
+        self._reset_decks()
         try:
             pygame.mixer.music.stop()
         except:
             pass
+        self._clear_end_events()
         self.is_playing = False
         self.paused = False
\ No newline at end of file
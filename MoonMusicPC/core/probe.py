@@ -0,0 +1,69 @@
+import os
+from collections import OrderedDict
+
+from mutagen.flac import FLAC
+from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+
+# 按文件头识别容器格式，QQ 的 C400 是 m4a，M500 则是扩展名可能不准的 mp3
+_PARSERS = {
+    "mp4": [MP4],
+    "mp3": [MP3],
+    "flac": [FLAC],
+    "ogg": [OggVorbis, OggOpus],
+}
+
+# 路径 -> (mtime, 大小, 探测结果)，同一文件重播不再解析；文件变化后覆盖旧条目，超过上限淘汰最久未用的。
+# 边下边播的 .part 每次探测大小都不同，不进缓存
+_cache = OrderedDict()
+CACHE_SIZE = 256
+
+
+def detect_format(filepath):
+    with open(filepath, 'rb') as f:
+        head = f.read(12)
+    if head[4:8] == b"ftyp": return "mp4"
+    if head[:4] == b"fLaC": return "flac"
+    if head[:4] == b"OggS": return "ogg"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0): return "mp3"
+    return None
+
+
+def probe(filepath):
+    # 只读取各格式的头部信息（MP3 帧头/Xing、MP4 moov、FLAC STREAMINFO、Ogg 首尾页），不解码音频
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    path = os.path.abspath(filepath)
+    cached = _cache.get(path)
+    if cached and cached[:2] == (st.st_mtime, st.st_size):
+        _cache.move_to_end(path)
+        return cached[2]
+    info = None
+    try:
+        fmt = detect_format(filepath)
+        for parser in _PARSERS.get(fmt, []):
+            try:
+                audio = parser(filepath)
+            except Exception:
+                continue
+            # offset 为音频数据前的 ID3v2 标签字节数，边下边播按字节估算可播放时长时要扣掉
+            info = {"format": fmt, "duration": audio.info.length,
+                    "bitrate": getattr(audio.info, "bitrate", 0) or 0,
+                    "offset": (getattr(audio.tags, "size", 0) or 0) if fmt == "mp3" else 0}
+            break
+    except OSError:
+        pass
+    if not path.endswith(".part"):
+        _cache[path] = (st.st_mtime, st.st_size, info)
+        _cache.move_to_end(path)
+        while len(_cache) > CACHE_SIZE: _cache.popitem(last=False)
+    return info
+
+
+def probe_duration(filepath, default=None):
+    info = probe(filepath)
+    return info["duration"] if info and info["duration"] else default
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+
+
+# userdata.json 的延迟写入：短时间内的多次修改合并成一次，在工作线程里写临时文件再原子替换。
+# journal 模式下平时只向 .journal 追加操作记录，累计到 compact_every 条时才整体重写快照并清空日志
+class UserDataStore:
+    def __init__(self, path, snapshot, delay=1.0, journal=False, compact_every=500):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.snapshot = snapshot
+        self.delay = delay
+        self.journal = journal
+        self.compact_every = compact_every
+        self.pending = []
+        self.dirty = False
+        self.journal_size = 0
+        self._timer = None
+        self._lock = None
+
+    def load(self):
+        # 返回 (快照, 快照之后的操作)，由调用方按顺序重放
+        data = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except:
+                pass
+        ops = []
+        if os.path.exists(self.journal_path):
+            try:
+                with open(self.journal_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            ops.append(json.loads(line))
+                        except ValueError:
+                            # 写到一半被中断的最后一行
+                            break
+            except OSError:
+                pass
+        self.journal_size = len(ops)
+        return data, ops
+
+    def record(self, op=None):
+        if self.journal and op is not None: self.pending.append(op)
+        self.dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        if self._timer is None or self._timer.done():
+            self._timer = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    def _take(self):
+        ops, self.pending = self.pending, []
+        self.dirty = False
+        compact = not self.journal or self.journal_size + len(ops) > self.compact_every
+        return (self.snapshot() if compact else None), ops
+
+    async def flush(self):
+        if self._lock is None: self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.dirty: return
+            data, ops = self._take()
+            try:
+                await asyncio.to_thread(self._write, data, ops)
+            except Exception as e:
+                print(f"用户数据写入失败: {e}")
+                self.pending = ops + self.pending
+                self.dirty = True
+
+    def flush_sync(self):
+        if not self.dirty: return
+        data, ops = self._take()
+        try:
+            self._write(data, ops)
+        except Exception as e:
+            print(f"用户数据写入失败: {e}")
+            self.pending = ops + self.pending
+            self.dirty = True
+
+    async def aclose(self):
+        if self._timer and not self._timer.done(): self._timer.cancel()
+        await self.flush()
+
+    def _write(self, data, ops):
+        if data is None:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                for op in ops:
+                    f.write(json.dumps(op, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_size += len(ops)
+            return
+        # 快照已包含日志里的全部操作，替换成功后日志即可丢弃；两步之间崩溃时重放也是幂等的
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self.journal_size = 0
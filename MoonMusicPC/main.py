@@ -6,13 +6,17 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 import flet as ft
 import asyncio
-import time
-import random
 
 # 引入模块化层
 from core.data import DataHelper
 from core.player import PlayerManager
 from services.crawler import CrawlerService
+from services.failover import SourceFailover
+from services.image_download import ImageDownloader
+from services.prefetch import PrefetchScheduler
+from services.ranking import group_key
+from ui.images import cached_image
+from ui.song_list import SongListView
 
 
 def main(page: ft.Page):
@@ -28,6 +32,30 @@ def main(page: ft.Page):
     helper = DataHelper()
     crawler = CrawlerService(helper)
     player = PlayerManager()
+    prefetch_options = helper.options.get("prefetch", {})
+    prefetcher = PrefetchScheduler(helper, crawler, depth=prefetch_options.get("depth", 2),
+                                   max_concurrent=prefetch_options.get("max_concurrent", 2),
+                                   max_kbps=prefetch_options.get("max_kbps", 0))
+    failover_options = helper.options.get("failover", {})
+    failover = SourceFailover(helper, crawler, budget=failover_options.get("budget", 8.0),
+                              max_candidates=failover_options.get("max_candidates", 3)) \
+        if failover_options.get("enabled", True) else None
+    image_downloader = ImageDownloader(helper, max_concurrent=helper.options.get("image_download_concurrency", 4))
+
+    shutdown_state = {"done": False}
+
+    async def shutdown():
+        # 落盘搜索缓存、来源统计、收藏/历史和音频缓存索引，并关闭连接池；只执行一次
+        if shutdown_state["done"]: return
+        shutdown_state["done"] = True
+        prefetcher.cancel_all()
+        player.stop()
+        crawler.save_state()
+        await helper.aclose()
+
+    # 桌面端关窗不会可靠地触发 page.on_close（那是会话过期事件），这里拦截关窗，在窗口事件里收尾后再销毁
+    page.window.prevent_close = True
+    page.on_close = lambda e: asyncio.create_task(shutdown())
 
     # 常量定义
     COLOR_CARD = "#252525"
@@ -41,10 +69,12 @@ def main(page: ft.Page):
 
     # --- UI 组件定义 ---
     mini_slider = ft.Slider(min=0, max=100, value=0, height=10, active_color=COLOR_ACCENT, disabled=True,
+                            secondary_active_color="white24",
                             on_change_start=lambda e: setattr(player, 'is_dragging', True),
                             on_change_end=lambda e: (
                             setattr(player, 'is_dragging', False), player.seek(e.control.value)))
     full_slider = ft.Slider(min=0, max=100, value=0, height=30, active_color=COLOR_ACCENT, thumb_color="white",
+                            secondary_active_color="white24",
                             on_change_start=lambda e: setattr(player, 'is_dragging', True),
                             on_change_end=lambda e: (
                             setattr(player, 'is_dragging', False), player.seek(e.control.value)))
@@ -64,15 +94,51 @@ def main(page: ft.Page):
     player.register_ui(page, mini_slider, full_slider, mini_time_label, full_time_label)
 
     # === 播放与逻辑 ===
-    async def preload_next_song():
-        next_s = player.get_next_song()
-        if not next_s: return
-        url = next_s['url']
-        if next_s['source'] == "QQ" and not url:
-            url = await crawler.get_qq_purl(next_s['id'], next_s.get('media_id'))
-        if url:
-            ext = "m4a" if "m4a" in url or "qqmusic" in url else "mp3"
-            await helper.download_file(url, "temp_cache", f"cache_{next_s['id']}.{ext}")
+    cover_state = {"url": ""}
+
+    def set_full_cover(url):
+        # 全屏封面用 300px 缓存图；未缓存时先保留上一张，缓存完成后再换
+        if not url or cover_state["url"] == url: return
+        cover_state["url"] = url
+        path = helper.images.cached(url, "cover")
+        if path: full_cover_img.src = path; return
+
+        async def fill():
+            path = await helper.images.get(url, "cover")
+            if cover_state["url"] != url: return
+            full_cover_img.src = path or url
+            try:
+                full_cover_img.update()
+            except:
+                pass
+
+        asyncio.create_task(fill())
+
+    def show_song_info(song):
+        mini_player_container.visible = True
+        mini_song_label.value = f"{song['name']} [{song['source']}]"
+        full_artist_label.value = song['artist']
+        set_full_cover(song['pic'])
+
+        is_fav = helper.is_favorite(song)
+        fav_icon_btn.icon = ft.Icons.FAVORITE if is_fav else ft.Icons.FAVORITE_BORDER
+        fav_icon_btn.icon_color = "red" if is_fav else "white"
+
+    async def play_failover(song):
+        # 换源成功后把文件记到原歌曲名下，下次直接播放本地文件
+        if not failover: return False
+        full_song_label.value = "切换音源中..."
+        page.update()
+        alt, path = await failover.acquire(song)
+        if player.get_current_song() is not song: return True
+        if not path: return False
+        helper.audio_cache.protect(path)
+        helper.remember_cache(song, path)
+        full_song_label.value = song['name']
+        if not player.load_and_play(path, duration=helper.probe_duration(path)): return False
+        show_snack(f"已切换到{alt['source']}音源")
+        prefetcher.schedule(player.playlist, player.current_index)
+        return True
 
     async def play_index_handler(index_change=0):
         target_song = None
@@ -85,17 +151,12 @@ def main(page: ft.Page):
 
         if not target_song: return
 
+        # 先取消已不在预取窗口内的任务，当前歌曲就绪后再补齐后续预取
+        prefetcher.schedule(player.playlist, player.current_index, start=False)
         helper.add_history(target_song)
 
-        mini_player_container.visible = True
-        mini_song_label.value = f"{target_song['name']} [{target_song['source']}]"
+        show_song_info(target_song)
         full_song_label.value = "缓冲中..."
-        full_artist_label.value = target_song['artist']
-        if target_song['pic']: full_cover_img.src = target_song['pic']
-
-        is_fav = helper.is_favorite(target_song)
-        fav_icon_btn.icon = ft.Icons.FAVORITE if is_fav else ft.Icons.FAVORITE_BORDER
-        fav_icon_btn.icon_color = "red" if is_fav else "white"
 
         player.stop()
         full_play_btn.icon = ft.Icons.PAUSE_CIRCLE_FILLED
@@ -103,44 +164,89 @@ def main(page: ft.Page):
         full_slider.disabled = True
         page.update()
 
-        play_url = target_song['url']
-        if target_song['source'] == "QQ" and not play_url:
-            play_url = await crawler.get_qq_purl(target_song['id'], target_song.get('media_id'))
-            if not play_url:
-                show_snack("资源获取失败", "#FF5252")
-                if player.auto_play and index_change == 1:
-                    await asyncio.sleep(2)
-                    await play_index_handler(1)
+        # 本地已有的文件直接播放，跳过地址解析和下载
+        local_path = helper.open_local(target_song)
+        if local_path:
+            full_song_label.value = target_song['name']
+            if player.load_and_play(local_path, duration=helper.probe_duration(local_path)):
+                page.update()
+                prefetcher.schedule(player.playlist, player.current_index)
                 return
 
-        ext = "m4a" if "m4a" in play_url or "qqmusic" in play_url else "mp3"
-        ok, path = await helper.download_file(play_url, "temp_cache", f"cache_{target_song['id']}.{ext}")
+        play_url = await crawler.resolve_play_url(target_song)
+        if not play_url:
+            crawler.ranker.record_result(target_song['source'], False)
+            if await play_failover(target_song): return
+            show_snack("资源获取失败", "#FF5252")
+            if player.auto_play and index_change == 1:
+                await asyncio.sleep(2)
+                await play_index_handler(1)
+            return
+        set_full_cover(target_song['pic'])
+
+        filename = helper.cache_filename(target_song, play_url)
+        cache_path = helper.target_path("temp_cache", filename)
+        dl_task = asyncio.create_task(helper.download_file(play_url, "temp_cache", filename))
+
+        # 边下边播：mp3 缓冲到前缀大小就开始播放，剩余部分继续在后台下载；格式按已缓冲部分的文件头判断
+        if helper.stream_prefix and filename.endswith(".mp3") and \
+                await helper.wait_buffered(dl_task, cache_path, helper.stream_prefix) and \
+                helper.is_mp3(f"{cache_path}.part"):
+            helper.audio_cache.protect(cache_path)
+            full_song_label.value = target_song['name']
+            if player.load_and_play(f"{cache_path}.part", stream_progress=lambda: helper.downloads.get(cache_path)):
+                page.update()
+                ok, _ = await dl_task
+                crawler.ranker.record_result(target_song['source'], ok)
+                if ok:
+                    helper.remember_cache(target_song, cache_path)
+                    prefetcher.schedule(player.playlist, player.current_index)
+                return
 
+        ok, path = await dl_task
+        crawler.ranker.record_result(target_song['source'], ok)
         if ok:
+            helper.audio_cache.protect(path)
+            helper.remember_cache(target_song, path)
             full_song_label.value = target_song['name']
-            success = player.load_and_play(path)
+            success = player.load_and_play(path, duration=helper.probe_duration(path))
             if success:
-                asyncio.create_task(preload_next_song())
-            else:
+                prefetcher.schedule(player.playlist, player.current_index)
+            elif not await play_failover(target_song):
                 show_snack("文件损坏", "#FF5252")
                 if player.auto_play and index_change == 1:
                     await asyncio.sleep(2)
                     await play_index_handler(1)
-        else:
+        elif not await play_failover(target_song):
             show_snack("下载失败", "#FF5252")
             if player.auto_play and index_change == 1:
                 await asyncio.sleep(2)
                 await play_index_handler(1)
 
+    # 自动播放时由播放器直接切到已预取的下一首（无缝或交叉淡化），这里只同步界面和后续预取
+    def on_track_changed(song, path):
+        helper.add_history(song)
+        helper.audio_cache.protect(path)
+        show_song_info(song)
+        full_song_label.value = song['name']
+        full_play_btn.icon = ft.Icons.PAUSE_CIRCLE_FILLED
+        page.update()
+        prefetcher.schedule(player.playlist, player.current_index)
+
     player.set_callback(lambda: asyncio.create_task(play_index_handler(1)))
+    player.set_track_changed_callback(on_track_changed)
+    player.set_transition(gapless=helper.options.get("gapless", True),
+                          crossfade=float(helper.options.get("crossfade_sec", 0)))
+    prefetcher.on_ready = lambda song, path: player.prepare_next(song, path, helper.probe_duration(path))
+    player.set_playlist_callback(lambda songs, start: asyncio.create_task(crawler.prefetch_play_urls(
+        [s for s in crawler.playlist_window(songs, start) if s.get('source') == "QQ" and not helper.local_path(s)])))
 
     async def download_item(s):
-        url = s['url']
-        if s['source'] == "QQ" and not url:
-            url = await crawler.get_qq_purl(s['id'], s.get('media_id'))
+        url = await crawler.resolve_play_url(s)
         if url:
             ext = "m4a" if "m4a" in url else "mp3"
-            await helper.download_file(url, "downloads", f"{s['name']}.{ext}")
+            ok, path = await helper.download_file(url, "downloads", f"{s['name']}.{ext}")
+            if ok: helper.remember_cache(s, path)
             show_snack(f"已下载: {s['name']}")
         else:
             show_snack("无法下载", "#FF5252")
@@ -157,14 +263,29 @@ def main(page: ft.Page):
         full_player_layer.visible = True
         full_player_layer.offset = ft.Offset(0, 0)
         full_player_layer.opacity = 1
+        player.set_view_state(full_visible=True)
         page.update()
 
     def close_full_player(e):
         full_player_layer.offset = ft.Offset(0, 1)
         full_player_layer.opacity = 0
         full_player_layer.visible = False
+        player.set_view_state(full_visible=False)
         page.update()
 
+    async def on_window_event(e):
+        if e.type == ft.WindowEventType.CLOSE:
+            try:
+                await shutdown()
+            finally:
+                await page.window.destroy()
+        elif e.type in (ft.WindowEventType.FOCUS, ft.WindowEventType.RESTORE, ft.WindowEventType.SHOW):
+            player.set_view_state(focused=True)
+        elif e.type in (ft.WindowEventType.BLUR, ft.WindowEventType.MINIMIZE, ft.WindowEventType.HIDE):
+            player.set_view_state(focused=False)
+
+    page.window.on_event = on_window_event
+
     mini_player_container = ft.Container(
         content=ft.Column([
             mini_slider,
@@ -310,47 +431,30 @@ def main(page: ft.Page):
                                     border_color="transparent", border_radius=15)
     music_list = ft.ListView(expand=True, spacing=10, padding=20)
 
-    def create_song_list_items(songs):
-        items = []
-        for idx, s in enumerate(songs):
-            def make_play(i): return lambda e: (
-                player.set_playlist(songs, i), asyncio.create_task(play_index_handler(0)))
-
-            def make_dl(sd): return lambda e: asyncio.create_task(download_item(sd))
-
-            src_col = {"网易": "#C20C0C", "QQ": "#31c27c", "酷狗": "#0091ff"}.get(s.get('source', ''), "grey")
-            items.append(ft.Container(
-                content=ft.Row([
-                    ft.Image(src=s['pic'], width=50, height=50, border_radius=5, fit="cover"),
-                    ft.Column([
-                        ft.Row([ft.Text(s['name'], weight="bold", size=14),
-                                ft.Container(content=ft.Text(s.get('source', '未知'), size=10, color="white"),
-                                             bgcolor=src_col, padding=4, border_radius=4)], spacing=5),
-                        ft.Text(s['artist'], size=12, color="grey")
-                    ], spacing=2, expand=True),
-                    ft.IconButton(ft.Icons.PLAY_CIRCLE_FILL, icon_color=COLOR_ACCENT, on_click=make_play(idx)),
-                    ft.IconButton(ft.Icons.DOWNLOAD_ROUNDED, icon_color="white54", on_click=make_dl(s))
-                ]), bgcolor=COLOR_CARD, padding=10, border_radius=10
-            ))
-        return items
+    # 歌曲列表按需构建：滚动时分页追加，行控件复用，封面只加载可见行
+    song_list = SongListView(music_list,
+                             on_play=lambda songs, i: (player.set_playlist(songs, i),
+                                                       asyncio.create_task(play_index_handler(0))),
+                             on_download=lambda s: asyncio.create_task(download_item(s)),
+                             is_offline=helper.local_path, accent=COLOR_ACCENT, card_color=COLOR_CARD,
+                             images=helper.images)
 
     def render_music_home():
-        music_list.controls.clear()
-        if music_input.value: return
+        # 离开搜索结果时作废进行中的搜索和分页
+        search_state["token"] += 1
+        search_state["cursor"] = None
+        if music_input.value:
+            song_list.show([])
+            return
 
         def load_list_data(data_list, title):
-            music_list.controls.clear()
-            music_list.controls.append(
-                ft.Row([
-                    ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: render_music_home()),
-                    ft.Text(title, size=20, weight="bold")
-                ], spacing=10)
-            )
-            if not data_list:
-                music_list.controls.append(
-                    ft.Container(content=ft.Text("暂无记录", color="grey"), alignment=ft.Alignment(0, 0), padding=50))
-            else:
-                music_list.controls.extend(create_song_list_items(data_list))
+            header = [ft.Row([
+                ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: render_music_home()),
+                ft.Text(title, size=20, weight="bold")
+            ], spacing=10)]
+            footer = [] if data_list else [
+                ft.Container(content=ft.Text("暂无记录", color="grey"), alignment=ft.Alignment(0, 0), padding=50)]
+            song_list.show(data_list, header=header, footer=footer)
             page.update()
 
         def build_card(icon, title, color_start, color_end, count, click_handler):
@@ -370,35 +474,72 @@ def main(page: ft.Page):
                 expand=True, height=130
             )
 
-        music_list.controls.append(
-            ft.Container(content=ft.Text("我的音乐库", size=26, weight="bold"), padding=ft.padding.only(bottom=5)))
+        header = [
+            ft.Container(content=ft.Text("我的音乐库", size=26, weight="bold"), padding=ft.padding.only(bottom=5))]
         row = ft.Row([
             build_card(ft.Icons.FAVORITE_ROUNDED, "我的收藏", "#FF512F", "#DD2476", len(helper.favorites),
-                       lambda e: load_list_data(helper.favorites, "我的收藏")),
+                       lambda e: load_list_data(helper.favorites.to_list(), "我的收藏")),
             build_card(ft.Icons.HISTORY_TOGGLE_OFF_ROUNDED, "最近播放", "#4FACFE", "#00F2FE", len(helper.history),
-                       lambda e: load_list_data(helper.history, "最近播放"))
+                       lambda e: load_list_data(helper.history.to_list(), "最近播放"))
         ], alignment="center", spacing=15)
-        music_list.controls.append(row)
+        header.append(row)
 
         if helper.history:
-            music_list.controls.append(ft.Container(height=20))
-            music_list.controls.append(ft.Text("继续聆听", size=18, weight="bold"))
-            music_list.controls.extend(create_song_list_items(helper.history[:3]))
+            header.append(ft.Container(height=20))
+            header.append(ft.Text("继续聆听", size=18, weight="bold"))
+        song_list.show(helper.history[:3], header=header)
+        page.update()
+
+    search_state = {"token": 0, "cursor": None, "local": [], "loading": False}
+
+    def search_results(remote):
+        # 本地结果在前，网络结果里与本地同名同歌手的去掉
+        local = search_state["local"]
+        local_keys = {group_key(s) for s in local}
+        return local + [s for s in remote if group_key(s) not in local_keys]
+
+    async def load_more_results():
+        # 滚动接近底部时在后台取下一页，到达后接在列表末尾
+        cursor, token = search_state["cursor"], search_state["token"]
+        if cursor is None or search_state["loading"] or not cursor.has_more or not cursor.started: return
+        search_state["loading"] = True
+        try:
+            remote = await cursor.next_page()
+        finally:
+            search_state["loading"] = False
+        if token != search_state["token"]: return
+        song_list.show(search_results(remote), mark_offline=True, keep_position=True)
         page.update()
 
+    song_list.on_near_end = lambda: asyncio.create_task(load_more_results())
+
     async def on_search_music(e):
         if not music_input.value:
             render_music_home()
             return
-        music_list.controls = [ft.ProgressBar(color=COLOR_PRIMARY)];
+        search_state["token"] += 1
+        token = search_state["token"]
+        # 本地曲库、收藏历史和已下载文件的结果立即显示（断网时也可用），网络结果去重后陆续接在后面
+        local = helper.search_local(music_input.value)
+        cursor = crawler.cursor(music_input.value, platform=music_platform_dd.value)
+        search_state.update(local=local, cursor=cursor, loading=False)
+        song_list.show(local, footer=[ft.ProgressBar(color=COLOR_PRIMARY)], mark_offline=True)
         page.update()
-        songs = await crawler.search_all(music_input.value, platform=music_platform_dd.value)
-        music_list.controls.clear()
+        songs = local
+        stream = cursor.stream()
+        try:
+            # 哪个平台先返回就先渲染，慢的平台到达后再合并刷新
+            async for remote, pending in stream:
+                if token != search_state["token"]: return
+                songs = search_results(remote)
+                footer = [ft.ProgressBar(color=COLOR_PRIMARY)] if pending else []
+                song_list.show(songs, footer=footer, mark_offline=True, keep_position=True)
+                page.update()
+        finally:
+            await stream.aclose()
         if not songs:
-            music_list.controls.append(ft.Text("未找到结果", color="grey"))
-        else:
-            music_list.controls.extend(create_song_list_items(songs))
-        page.update()
+            song_list.show([], footer=[ft.Text("未找到结果", color="grey")])
+            page.update()
 
     music_input.on_submit = on_search_music
     music_input.on_change = lambda e: render_music_home() if e.control.value == "" else None
@@ -416,25 +557,104 @@ def main(page: ft.Page):
 
     async def download_img_handler(url):
         show_snack("正在下载...", COLOR_PRIMARY)
-        ext = "jpg"
-        if ".png" in url:
-            ext = "png"
-        elif ".gif" in url:
-            ext = "gif"
-        elif ".webp" in url:
-            ext = "webp"
-        filename = f"img_{int(time.time())}_{random.randint(1000, 9999)}.{ext}"
-        success, result = await helper.download_file(url, "downloads/images", filename)
-        if success:
+        status, result = await image_downloader.download(url)
+        if status == "saved":
             show_snack(f"下载成功！{result}", COLOR_ACCENT)
+        elif status == "duplicate":
+            show_snack(f"已下载过: {result}", COLOR_ACCENT)
         else:
             show_snack(f"下载失败: {result}", "#FF5252")
 
+    async def download_all_images():
+        # 下载当前网格里已显示的全部图片，按钮上显示进度
+        urls = list(img_state["urls"])
+        if not urls or download_all_btn.disabled: return
+        download_all_btn.disabled = True
+
+        def on_progress(done, total):
+            download_all_btn.content = f"下载中 {done}/{total}"
+            try:
+                download_all_btn.update()
+            except:
+                pass
+
+        on_progress(0, len(urls))
+        try:
+            counts = await image_downloader.download_all(urls, on_progress)
+        finally:
+            download_all_btn.disabled = False
+            download_all_btn.content = "全部下载"
+        show_snack(f"已保存 {counts['saved']} 张，重复 {counts['duplicate']} 张，失败 {counts['failed']} 张",
+                   COLOR_ACCENT if counts['saved'] or counts['duplicate'] else "#FF5252")
+        page.update()
+
+    # 当前搜图的状态：first 为 Bing 下一页的偏移，seen 用于跨页去重；token 变化说明已开始新的搜索或回到首页
+    img_state = {"token": 0, "keyword": "", "first": 1, "seen": set(), "urls": [], "grid": None, "loading": False}
+    more_img_btn = ft.TextButton("更多图片", icon=ft.Icons.EXPAND_MORE, visible=False,
+                                 on_click=lambda e: asyncio.create_task(load_more_images()))
+    download_all_btn = ft.TextButton("全部下载", icon=ft.Icons.DOWNLOAD_ROUNDED,
+                                     on_click=lambda e: asyncio.create_task(download_all_images()))
+
+    def build_img_tile(i):
+        return ft.Container(
+            content=ft.Stack([
+                cached_image(helper.images, i['thumb'], "cover", fit="cover", border_radius=10,
+                             width=float("inf"), height=float("inf")),
+                ft.Container(on_click=lambda e, src=i['url']: asyncio.create_task(page.launch_url(src)),
+                             expand=True),
+                ft.Container(
+                    content=ft.IconButton(ft.Icons.DOWNLOAD_ROUNDED, icon_color="white", bgcolor="#66000000",
+                                          icon_size=20,
+                                          on_click=lambda e, u=i['url']: asyncio.create_task(
+                                              download_img_handler(u))),
+                    bottom=5, right=5, border_radius=50)
+            ]),
+            aspect_ratio=1, border_radius=10, clip_behavior=ft.ClipBehavior.HARD_EDGE
+        )
+
+    async def fetch_images(token):
+        # 取下一批并去掉已显示过的图片；搜索已被替换时返回 None
+        imgs = await crawler.search_images_bing(img_state["keyword"], img_state["first"])
+        if token != img_state["token"]: return None
+        img_state["first"] += len(imgs)
+        fresh = []
+        for i in imgs:
+            if i['url'] in img_state["seen"]: continue
+            img_state["seen"].add(i['url'])
+            img_state["urls"].append(i['url'])
+            fresh.append(i)
+        more_img_btn.visible = bool(imgs)
+        return fresh
+
+    async def load_more_images():
+        if img_state["loading"] or img_state["grid"] is None: return
+        token = img_state["token"]
+        img_state["loading"] = True
+        more_img_btn.disabled = True
+        more_img_btn.content = "加载中..."
+        page.update()
+        try:
+            fresh = await fetch_images(token)
+        finally:
+            if token == img_state["token"]:
+                img_state["loading"] = False
+                more_img_btn.disabled = False
+                more_img_btn.content = "更多图片"
+        if fresh is None: return
+        img_state["grid"].controls.extend(build_img_tile(i) for i in fresh)
+        page.update()
+
     async def on_search_img(keyword=None):
         if keyword: img_input.value = keyword
         val = img_input.value
         if not val: render_img_home(); return
 
+        img_state.update(token=img_state["token"] + 1, keyword=val, first=1, seen=set(), urls=[], grid=None,
+                         loading=False)
+        token = img_state["token"]
+        more_img_btn.visible = False
+        more_img_btn.disabled = False
+        more_img_btn.content = "更多图片"
         img_body.controls.clear()
         img_body.controls.append(ft.Row([
             ft.IconButton(ft.Icons.ARROW_BACK, on_click=lambda e: (setattr(img_input, 'value', ''), render_img_home())),
@@ -443,31 +663,19 @@ def main(page: ft.Page):
         img_body.controls.append(ft.ProgressBar(color=COLOR_PRIMARY));
         page.update()
 
-        imgs = await crawler.search_images_bing(val)
+        imgs = await fetch_images(token)
+        if imgs is None: return
         img_body.controls.pop()
 
         if not imgs:
             img_body.controls.append(
                 ft.Container(content=ft.Text("未找到相关图片", color="grey"), alignment=ft.Alignment(0, 0), padding=50))
         else:
-            grid = ft.GridView(expand=True, runs_count=2, spacing=10, run_spacing=10, controls=[
-                ft.Container(
-                    content=ft.Stack([
-                        ft.Image(src=i['thumb'], fit="cover", border_radius=10, width=float("inf"),
-                                 height=float("inf")),
-                        ft.Container(on_click=lambda e, src=i['url']: asyncio.create_task(page.launch_url(src)),
-                                     expand=True),
-                        ft.Container(
-                            content=ft.IconButton(ft.Icons.DOWNLOAD_ROUNDED, icon_color="white", bgcolor="#66000000",
-                                                  icon_size=20,
-                                                  on_click=lambda e, u=i['url']: asyncio.create_task(
-                                                      download_img_handler(u))),
-                            bottom=5, right=5, border_radius=50)
-                    ]),
-                    aspect_ratio=1, border_radius=10, clip_behavior=ft.ClipBehavior.HARD_EDGE
-                ) for i in imgs
-            ])
+            grid = ft.GridView(expand=True, runs_count=2, spacing=10, run_spacing=10,
+                               controls=[build_img_tile(i) for i in imgs])
+            img_state["grid"] = grid
             img_body.controls.append(ft.Container(content=grid, height=600, expand=True))
+            img_body.controls.append(ft.Row([more_img_btn, download_all_btn], alignment="center"))
         page.update()
 
     img_input.on_submit = lambda e: asyncio.create_task(on_search_img())
@@ -475,6 +683,7 @@ def main(page: ft.Page):
 
     def render_img_home():
         if img_input.value: return
+        img_state.update(token=img_state["token"] + 1, grid=None)
         img_body.controls.clear()
 
         def build_big_card(title, subtitle, icon, color1, color2, keyword):
@@ -550,7 +759,7 @@ def main(page: ft.Page):
             bg = {"Bilibili": "#FB7299", "小红书": "#FF2442", "抖音": "#000000", "微博": "#E6162D"}.get(u['platform'],
                                                                                                         COLOR_CARD)
             item = ft.Container(content=ft.Row([
-                ft.Image(src=u['pic'], width=50, height=50, border_radius=25, fit="cover"),
+                cached_image(helper.images, u['pic'], width=50, height=50, border_radius=25, fit="cover"),
                 ft.Column([
                     ft.Row([ft.Text(u['name'], weight="bold"),
                             ft.Container(content=ft.Text(u['platform'], size=10), bgcolor=bg, padding=3,
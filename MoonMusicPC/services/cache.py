@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_keyword(keyword):
+    text = unicodedata.normalize("NFKC", keyword or "").lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# 进程内 LRU 缓存，每个条目带独立的过期时间（墙钟时间，便于落盘后恢复）
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value = entry
+        if expires < time.time():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, ttl=None):
+        self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get_or_fetch(self, key, fetch):
+        # 同一 key 的并发请求合并为一次 fetch；fetch 返回 (value, ttl)，value 为空时不缓存
+        value = self.get(key)
+        if value is not None: return value
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 单个调用方被取消时不影响其他等待同一结果的调用方
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetch):
+        value, ttl = await fetch()
+        if value: self.put(key, value, ttl)
+        return value
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def save(self, path):
+        now = time.time()
+        rows = [[list(k) if isinstance(k, tuple) else k, exp, v] for k, (exp, v) in self._data.items() if exp > now]
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"缓存写入失败: {e}")
+
+    def load(self, path):
+        if not os.path.exists(path): return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+        except:
+            return
+        now = time.time()
+        for key, exp, value in rows:
+            if exp > now:
+                self._data[tuple(key) if isinstance(key, list) else key] = (exp, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
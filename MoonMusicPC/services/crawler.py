@@ -1,45 +1,165 @@
+import html
 import json
 import random
+import re
 import urllib.parse
 import asyncio
-import httpx
-from bs4 import BeautifulSoup
+
+from services.cache import TTLCache, normalize_keyword
+from services.latency import LatencyTracker
+from services.ranking import SourceRanker
+
+# 各平台搜索结果缓存时长（秒），可在 config.json 的 search_cache.ttl 中覆盖
+SEARCH_TTL = {"netease": 1800, "qq": 1800, "kugou": 900}
+# QQ vkey 默认有效期与提前失效余量（秒）
+QQ_VKEY_TTL = 1800
+QQ_VKEY_MARGIN = 120
+# 单次 CgiGetVkey 请求最多解析的歌曲数（每首歌占两个文件名）
+QQ_VKEY_BATCH = 50
+# 换播放列表时只预解析当前歌曲之后这么多首，长列表（如上千首收藏）不一次性请求
+PURL_PREFETCH_WINDOW = 100
+# 酷狗播放地址缓存时长（秒）与详情接口并发上限
+KUGOU_URL_TTL = 3600
+KUGOU_CONCURRENCY = 2
+# 各平台搜索耗时预算（秒），超时返回空结果，可在 config.json 的 search_budget 中覆盖
+SEARCH_BUDGET = {"netease": 4.0, "qq": 4.0, "kugou": 6.0}
+# 各平台每页结果数，可在 config.json 的 search_page_size 中覆盖
+PAGE_SIZE = {"netease": 20, "qq": 20, "kugou": 20}
+# Bing 搜图每页请求的结果数
+BING_PAGE_SIZE = 35
+
+# Bing 结果页里每张图是一个 <a class="iusc" m="{...}">，m 属性是 HTML 转义后的 JSON（murl 原图，turl 缩略图）
+# 属性值按引号整体匹配（m 里的标题可能含 ">"），class 按单词匹配（可能带其他类名）
+_BING_ATTRS = r'(?:[^>"\']|"[^"]*"|\'[^\']*\')*'
+_BING_IUSC = re.compile(r'<a\s' + _BING_ATTRS + r'\bclass="[^"]*\biusc\b[^"]*"' + _BING_ATTRS + '>')
+_BING_M = re.compile(r'\sm="([^"]*)"')
+_BING_MIMG = re.compile(r'<img\s' + _BING_ATTRS + r'\bclass="[^"]*\bmimg\b[^"]*"' + _BING_ATTRS + '>')
+_BING_SRC = re.compile(r'\s(?:src|data-src)="(http[^"]*)"')
+
+
+def iter_bing_images(page_html):
+    # 只扫描 iusc 链接的开始标签并解析其中的 m 属性，不构建整棵 DOM
+    for tag in _BING_IUSC.finditer(page_html):
+        m = _BING_M.search(tag.group(0))
+        if not m: continue
+        try:
+            m_data = json.loads(html.unescape(m.group(1)))
+        except:
+            continue
+        img_url = m_data.get('turl') or m_data.get('murl')
+        if img_url: yield {"url": m_data.get('murl'), "thumb": img_url}
+
+
+def extract_bing_images(page_html):
+    results = list(iter_bing_images(page_html))
+    if not results:
+        # 页面结构变化时退回到结果区的 img.mimg
+        for tag in _BING_MIMG.finditer(page_html):
+            src = _BING_SRC.search(tag.group(0))
+            if src:
+                url = html.unescape(src.group(1))
+                results.append({"url": url, "thumb": url})
+    return results
+
 
 class CrawlerService:
     def __init__(self, helper):
         self.helper = helper
+        options = helper.options.get("search_cache", {})
+        self.search_ttl = {**SEARCH_TTL, **options.get("ttl", {})}
+        self.search_cache = TTLCache(maxsize=options.get("max_entries", 300))
+        self.search_cache_file = options.get("file", "search_cache.json") if options.get("persist", True) else None
+        if self.search_cache_file: self.search_cache.load(self.search_cache_file)
+        self.search_budget = {**SEARCH_BUDGET, **helper.options.get("search_budget", {})}
+        self.hedge_enabled = helper.options.get("search_hedge", True)
+        self.page_size = {**PAGE_SIZE, **helper.options.get("search_page_size", {})}
+        self.latency = LatencyTracker()
+        # 跨平台去重合并，首选来源按 source_stats.json 里累计的成功率挑选
+        self.dedupe = helper.options.get("search_dedupe", True)
+        self.ranker = SourceRanker(self.latency, "source_stats.json")
+        self.ranker.load()
+        self.purl_cache = TTLCache(maxsize=500, ttl=QQ_VKEY_TTL)
+        self.kugou_cache = TTLCache(maxsize=500, ttl=KUGOU_URL_TTL)
+        self._kugou_sem = None
+
+    @property
+    def client(self):
+        return self.helper.net.client
 
-    async def search_netease(self, keyword):
+    async def search_netease(self, keyword, page=1):
         url = "https://music.163.com/api/search/get/web"
-        params = {"s": keyword, "type": 1, "offset": 0, "total": "true", "limit": 10}
-        async with httpx.AsyncClient(verify=False) as client:
-            try:
-                headers = self.helper.get_headers("netease")
-                resp = await client.post(url, headers=headers, data=params)
-                data = resp.json()
-                songs = data['result']['songs']
-                results = []
-                for s in songs:
-                    pic_url = s.get('album', {}).get('picUrl', '')
-                    if not pic_url and s.get('artists'): pic_url = s['artists'][0].get('img1v1Url', '')
-                    results.append({
-                        "name": s['name'],
-                        "artist": s['artists'][0]['name'],
-                        "id": s['id'],
-                        "media_id": s['id'],
-                        "pic": pic_url,
-                        "url": f"http://music.163.com/song/media/outer/url?id={s['id']}.mp3",
-                        "source": "网易"
-                    })
-                return results
-            except:
-                return []
+        size = self.page_size["netease"]
+        params = {"s": keyword, "type": 1, "offset": (page - 1) * size, "total": "true", "limit": size}
+        try:
+            headers = self.helper.get_headers("netease")
+            resp = await self.client.post(url, headers=headers, data=params)
+            data = resp.json()
+            songs = data['result']['songs']
+            results = []
+            for s in songs:
+                pic_url = s.get('album', {}).get('picUrl', '')
+                if not pic_url and s.get('artists'): pic_url = s['artists'][0].get('img1v1Url', '')
+                results.append({
+                    "name": s['name'],
+                    "artist": s['artists'][0]['name'],
+                    "id": s['id'],
+                    "media_id": s['id'],
+                    "pic": pic_url,
+                    "url": f"http://music.163.com/song/media/outer/url?id={s['id']}.mp3",
+                    "source": "网易"
+                })
+            return results
+        except:
+            return []
 
     async def get_qq_purl(self, songmid, media_id=None):
         if not media_id: media_id = songmid
+        key = (songmid, media_id, self.helper.qq_uin)
+        return await self.purl_cache.get_or_fetch(key, lambda: self._fetch_qq_purl(songmid, media_id)) or ""
+
+    async def _fetch_qq_purl(self, songmid, media_id):
+        urls, ttl = await self._fetch_qq_purl_batch([(songmid, media_id)])
+        return urls.get(songmid, ""), ttl
+
+    async def get_qq_purls(self, pairs):
+        # 批量解析 [(songmid, media_id), ...]，命中缓存的直接返回，其余按批次合并到一次 CgiGetVkey 请求
+        uin = self.helper.qq_uin
+        result, todo = {}, []
+        for songmid, media_id in pairs:
+            media_id = media_id or songmid
+            hit = self.purl_cache.get((songmid, media_id, uin))
+            if hit:
+                result[songmid] = hit
+            elif (songmid, media_id) not in todo:
+                todo.append((songmid, media_id))
+        chunks = [todo[i:i + QQ_VKEY_BATCH] for i in range(0, len(todo), QQ_VKEY_BATCH)]
+        # 逐批请求，避免同时发出大量 CgiGetVkey；每批的有效期只用于该批自己的地址，某一批失败（ttl 为 0）不影响其他批次
+        for chunk in chunks:
+            urls, ttl = await self._fetch_qq_purl_batch(chunk)
+            result.update(urls)
+            for songmid, media_id in chunk:
+                if urls.get(songmid):
+                    self.purl_cache.put((songmid, media_id, uin), urls[songmid], ttl)
+        return result
+
+    def playlist_window(self, songs, start=0):
+        # 从 start 起（到末尾后绕回开头）最多 PURL_PREFETCH_WINDOW 首
+        count = min(len(songs), PURL_PREFETCH_WINDOW)
+        return [songs[(start + k) % len(songs)] for k in range(count)]
+
+    async def prefetch_play_urls(self, songs):
+        pairs = [(s['id'], s.get('media_id')) for s in songs if s.get('source') == "QQ" and not s.get('url')]
+        if pairs: await self.get_qq_purls(pairs)
+
+    async def _fetch_qq_purl_batch(self, pairs):
+        # 每首歌依次请求 M500(mp3) 与 C400(m4a)，同一首歌取第一个有效地址
         guid = str(random.randint(1000000000, 9999999999))
-        file_types = [{"prefix": "M500", "ext": "mp3", "mid": media_id},
-                      {"prefix": "C400", "ext": "m4a", "mid": media_id}]
+        file_types = [("M500", "mp3"), ("C400", "m4a")]
+        songmids, filenames = [], []
+        for songmid, media_id in pairs:
+            for prefix, ext in file_types:
+                songmids.append(songmid)
+                filenames.append(f"{prefix}{media_id}.{ext}")
         url = "https://u.y.qq.com/cgi-bin/musicu.fcg"
         data = {
             "req": {"module": "CDN.SrfCdnDispatchServer", "method": "GetCdnDispatch",
@@ -49,103 +169,186 @@ class CrawlerService:
                 "method": "CgiGetVkey",
                 "param": {
                     "guid": guid,
-                    "songmid": [songmid] * 2,
-                    "songtype": [0] * 2,
+                    "songmid": songmids,
+                    "songtype": [0] * len(songmids),
                     "uin": self.helper.qq_uin,
                     "loginflag": 1,
                     "platform": "20",
-                    "filename": [f"{ft['prefix']}{ft['mid']}.{ft['ext']}" for ft in file_types]
+                    "filename": filenames
                 }
             }
         }
-        async with httpx.AsyncClient(verify=False) as client:
-            try:
-                headers = self.helper.get_headers("qq")
-                resp = await client.get(url, params={"data": json.dumps(data)}, headers=headers)
-                js = resp.json()
-                midurlinfos = js.get('req_0', {}).get('data', {}).get('midurlinfo', [])
-                sip = js.get('req_0', {}).get('data', {}).get('sip', [])
-                for info in midurlinfos:
-                    if info.get('purl'):
-                        base = sip[0] if sip else "http://ws.stream.qqmusic.qq.com/"
-                        return f"{base}{info['purl']}"
-                return ""
-            except:
-                return ""
+        try:
+            headers = self.helper.get_headers("qq")
+            resp = await self.client.get(url, params={"data": json.dumps(data)}, headers=headers)
+            js = resp.json()
+            vkey_data = js.get('req_0', {}).get('data', {})
+            midurlinfos = vkey_data.get('midurlinfo', [])
+            sip = vkey_data.get('sip', [])
+            base = sip[0] if sip else "http://ws.stream.qqmusic.qq.com/"
+            urls = {}
+            for i, info in enumerate(midurlinfos):
+                songmid = info.get('songmid') or (songmids[i] if i < len(songmids) else None)
+                if songmid and info.get('purl') and songmid not in urls:
+                    urls[songmid] = f"{base}{info['purl']}"
+            return urls, self._vkey_ttl(vkey_data)
+        except:
+            return {}, 0
 
-    async def search_qq(self, keyword):
-        search_url = f"https://c.y.qq.com/soso/fcgi-bin/client_search_cp?p=1&n=10&w={keyword}&format=json"
-        async with httpx.AsyncClient(verify=False) as client:
-            try:
-                headers = self.helper.get_headers("qq")
-                resp = await client.get(search_url, headers=headers)
-                text = resp.text
-                if text.startswith("callback("):
-                    text = text[9:-1]
-                elif text.endswith(")"):
-                    text = text[text.find("(") + 1:-1]
-                data = json.loads(text)
-                songs = data['data']['song']['list']
-                results = []
-                for s in songs:
-                    songmid = s['songmid']
-                    media_mid = s.get('media_mid', s.get('strMediaMid', songmid))
-                    albummid = s['albummid']
-                    pic = f"https://y.gtimg.cn/music/photo_new/T002R300x300M000{albummid}.jpg" if albummid else ""
-                    results.append({
-                        "name": s['songname'],
-                        "artist": s['singer'][0]['name'],
-                        "id": songmid,
-                        "media_id": media_mid,
-                        "pic": pic,
-                        "url": "",
-                        "source": "QQ"
-                    })
-                return results
-            except:
-                return []
+    @staticmethod
+    def _vkey_ttl(vkey_data):
+        # 按接口返回的 vkey 有效期缓存，提前留出余量避免播放到一半过期
+        try:
+            lifetime = int(vkey_data.get('expiration') or QQ_VKEY_TTL)
+        except (TypeError, ValueError):
+            lifetime = QQ_VKEY_TTL
+        return max(0, lifetime - QQ_VKEY_MARGIN)
+
+    async def search_qq(self, keyword, page=1):
+        search_url = f"https://c.y.qq.com/soso/fcgi-bin/client_search_cp?p={page}&n={self.page_size['qq']}&w={keyword}&format=json"
+        try:
+            headers = self.helper.get_headers("qq")
+            resp = await self.client.get(search_url, headers=headers)
+            text = resp.text
+            if text.startswith("callback("):
+                text = text[9:-1]
+            elif text.endswith(")"):
+                text = text[text.find("(") + 1:-1]
+            data = json.loads(text)
+            songs = data['data']['song']['list']
+            results = []
+            for s in songs:
+                songmid = s['songmid']
+                media_mid = s.get('media_mid', s.get('strMediaMid', songmid))
+                albummid = s['albummid']
+                pic = f"https://y.gtimg.cn/music/photo_new/T002R300x300M000{albummid}.jpg" if albummid else ""
+                results.append({
+                    "name": s['songname'],
+                    "artist": s['singer'][0]['name'],
+                    "id": songmid,
+                    "media_id": media_mid,
+                    "pic": pic,
+                    "url": "",
+                    "source": "QQ"
+                })
+            return results
+        except:
+            return []
+
+    async def search_kugou(self, keyword, page=1):
+        # 只用列表接口，播放地址在播放/预加载时由 get_kugou_detail 按需解析
+        search_url = f"http://mobilecdn.kugou.com/api/v3/search/song?format=json&keyword={keyword}" \
+                     f"&page={page}&pagesize={self.page_size['kugou']}"
+        try:
+            headers = self.helper.get_headers("kugou")
+            resp = await self.client.get(search_url, headers=headers)
+            data = resp.json()
+            songs = data['data']['info']
+            results = []
+            for s in songs:
+                cover = (s.get('trans_param') or {}).get('union_cover', '')
+                results.append({
+                    "name": s.get('songname') or s.get('filename', ''),
+                    "artist": s.get('singername', ''),
+                    "id": s['hash'],
+                    "media_id": s['hash'],
+                    "album_id": s.get('album_id', ''),
+                    "pic": cover.replace("{size}", "150") if cover else "",
+                    "url": "",
+                    "source": "酷狗"
+                })
+            return results
+        except:
+            return []
+
+    async def get_kugou_detail(self, song_hash, album_id=""):
+        return await self.kugou_cache.get_or_fetch(song_hash, lambda: self._fetch_kugou_detail(song_hash, album_id)) or {}
 
-    async def search_kugou(self, keyword):
-        search_url = f"http://mobilecdn.kugou.com/api/v3/search/song?format=json&keyword={keyword}&page=1&pagesize=6"
-        async with httpx.AsyncClient(verify=False) as client:
+    async def _fetch_kugou_detail(self, song_hash, album_id):
+        if self._kugou_sem is None: self._kugou_sem = asyncio.Semaphore(KUGOU_CONCURRENCY)
+        async with self._kugou_sem:
             try:
                 headers = self.helper.get_headers("kugou")
-                resp = await client.get(search_url, headers=headers)
-                data = resp.json()
-                songs = data['data']['info']
-                tasks = []
-                for s in songs:
-                    tasks.append(client.get(
-                        f"http://www.kugou.com/yy/index.php?r=play/getdata&hash={s['hash']}&album_id={s.get('album_id', '')}",
-                        headers=headers))
-                detail_resps = await asyncio.gather(*tasks, return_exceptions=True)
-                results = []
-                for r in detail_resps:
-                    if isinstance(r, httpx.Response):
-                        try:
-                            d = r.json()['data']
-                            if d['play_url']:
-                                results.append({
-                                    "name": d['audio_name'],
-                                    "artist": d['author_name'],
-                                    "id": d['hash'],
-                                    "media_id": d['hash'],
-                                    "pic": d['img'],
-                                    "url": d['play_url'],
-                                    "source": "酷狗"
-                                })
-                        except:
-                            pass
-                return results
+                resp = await self.client.get(
+                    f"http://www.kugou.com/yy/index.php?r=play/getdata&hash={song_hash}&album_id={album_id}",
+                    headers=headers)
+                d = resp.json()['data']
+                if not d.get('play_url'): return {}, 0
+                detail = {"url": d['play_url'], "pic": d.get('img', ''),
+                          "name": d.get('audio_name', ''), "artist": d.get('author_name', '')}
+                return detail, KUGOU_URL_TTL
             except:
-                return []
+                return {}, 0
 
-    async def search_all(self, keyword, platform="all"):
-        tasks = []
-        if platform in ["all", "netease"]: tasks.append(self.search_netease(keyword))
-        if platform in ["all", "qq"]: tasks.append(self.search_qq(keyword))
-        if platform in ["all", "kugou"]: tasks.append(self.search_kugou(keyword))
-        results = await asyncio.gather(*tasks)
+    async def resolve_play_url(self, song):
+        if song.get('url'): return song['url']
+        if song['source'] == "QQ":
+            return await self.get_qq_purl(song['id'], song.get('media_id'))
+        if song['source'] == "酷狗":
+            detail = await self.get_kugou_detail(song['id'], song.get('album_id', ''))
+            if detail.get('pic') and not song.get('pic'): song['pic'] = detail['pic']
+            return detail.get('url', "")
+        return ""
+
+    def save_state(self):
+        if self.search_cache_file: self.search_cache.save(self.search_cache_file)
+        self.ranker.save()
+
+    async def _timed_search(self, name, func, keyword, page=1):
+        # 在预算内等待结果；超过该平台 p95 仍未返回时补发一个对冲请求，先到先用
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.search_budget.get(name, 5.0)
+        tasks = [asyncio.create_task(func(keyword, page))]
+        hedge_at = self.latency.percentile(name, 0.95) if self.hedge_enabled else None
+        if hedge_at is not None and start + hedge_at >= deadline: hedge_at = None
+        try:
+            while tasks:
+                now = loop.time()
+                if now >= deadline: break
+                wait_until = start + hedge_at if hedge_at is not None else deadline
+                done, _ = await asyncio.wait(tasks, timeout=max(0, wait_until - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done and hedge_at is not None:
+                    hedge_at = None
+                    self.latency.record_hedge(name)
+                    tasks.append(asyncio.create_task(func(keyword, page)))
+                    continue
+                for task in done:
+                    tasks.remove(task)
+                    results = task.result()
+                    if results:
+                        self.latency.record(name, loop.time() - start)
+                        return results
+            if tasks: self.latency.record_timeout(name)
+            return []
+        finally:
+            for task in tasks: task.cancel()
+
+    def latency_stats(self):
+        return self.latency.snapshot()
+
+    async def _cached_search(self, name, func, keyword, page=1):
+        key = (normalize_keyword(keyword), name, page)
+        hit = self.search_cache.get(key)
+        if hit is not None:
+            return [dict(s) for s in hit]
+        results = await self._timed_search(name, func, keyword, page)
+        # 空结果多半是接口失败，不缓存
+        if results:
+            self.search_cache.put(key, [dict(s) for s in results], ttl=self.search_ttl.get(name))
+        return results
+
+    def _platform_sources(self, platform):
+        sources = []
+        if platform in ["all", "netease"]: sources.append(("netease", self.search_netease))
+        if platform in ["all", "qq"]: sources.append(("qq", self.search_qq))
+        if platform in ["all", "kugou"]: sources.append(("kugou", self.search_kugou))
+        return sources
+
+    @staticmethod
+    def _merge(results):
+        # 各平台结果轮流穿插
         merged = []
         if results:
             max_len = max(len(r) for r in results)
@@ -154,55 +357,54 @@ class CrawlerService:
                     if i < len(r): merged.append(r[i])
         return merged
 
-    async def search_images_bing(self, keyword):
-        url = f"https://www.bing.com/images/search?q={keyword}&form=HDRSC2&first=1"
-        async with httpx.AsyncClient(verify=False, follow_redirects=True) as client:
-            try:
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-                    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-                    "Referer": "https://www.bing.com/"
-                }
-                resp = await client.get(url, headers=headers, timeout=8)
-                soup = BeautifulSoup(resp.text, 'html.parser')
-
-                results = []
-                iusc_links = soup.select('a.iusc')
-                for link in iusc_links:
-                    try:
-                        m_str = link.get('m')
-                        if m_str:
-                            m_data = json.loads(m_str)
-                            img_url = m_data.get('turl') or m_data.get('murl')
-                            full_url = m_data.get('murl')
-                            if img_url:
-                                results.append({"url": full_url, "thumb": img_url})
-                    except:
-                        continue
-
-                if not results:
-                    imgs = soup.select('img.mimg')
-                    for img in imgs:
-                        src = img.get('src') or img.get('data-src')
-                        if src and src.startswith('http'):
-                            results.append({"url": src, "thumb": src})
-
-                random.shuffle(results)
-                return results[:24]
-            except Exception as e:
-                print(f"搜图出错: {e}")
-                return []
+    def merge_results(self, results):
+        return self.ranker.merge(results) if self.dedupe else self._merge(results)
+
+    async def search_platforms(self, keyword, exclude=()):
+        # 并行搜索 exclude 以外的各平台第一页（走搜索缓存），返回各平台未合并的结果列表
+        sources = [(n, f) for n, f in self._platform_sources("all") if n not in exclude]
+        return await asyncio.gather(*[self._cached_search(n, f, keyword) for n, f in sources])
+
+    def cursor(self, keyword, platform="all"):
+        return SearchCursor(self, keyword, platform)
+
+    async def search_stream(self, keyword, platform="all"):
+        # 每有一个平台返回就产出一次 (当前合并结果, 仍在等待的平台数)
+        async for item in self.cursor(keyword, platform).stream():
+            yield item
+
+    async def search_all(self, keyword, platform="all"):
+        merged = []
+        async for merged, _ in self.search_stream(keyword, platform):
+            pass
+        return merged
+
+    async def search_images_bing(self, keyword, first=1):
+        # first 为结果偏移（从 1 开始），翻页时传入上一页的 first + 本页条数
+        query = urllib.parse.quote(keyword)
+        url = f"https://www.bing.com/images/search?q={query}&form=HDRSC2&first={first}&count={BING_PAGE_SIZE}"
+        try:
+            headers = {
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
+                "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+                "Referer": "https://www.bing.com/"
+            }
+            resp = await self.client.get(url, headers=headers, timeout=8, follow_redirects=True)
+            return await asyncio.to_thread(extract_bing_images, resp.text)
+        except Exception as e:
+            print(f"搜图出错: {e}")
+            return []
 
     async def search_social_users(self, keyword, platform="all"):
         results = []
 
-        async def fetch_bili(client):
+        async def fetch_bili():
             try:
                 bili_url = f"https://api.bilibili.com/x/web-interface/search/type?search_type=bili_user&keyword={urllib.parse.quote(keyword)}"
                 headers = self.helper.get_headers("bilibili")
                 if "Cookie" not in headers: headers["Cookie"] = "buvid3=infoc;"
-                resp = await client.get(bili_url, headers=headers)
+                resp = await self.client.get(bili_url, headers=headers, timeout=4.0)
                 data = resp.json()
                 local_res = []
                 if data.get('code') == 0 and data.get('data') and data['data'].get('result'):
@@ -218,7 +420,7 @@ class CrawlerService:
             except:
                 return []
 
-        async def fetch_weibo(client):
+        async def fetch_weibo():
             try:
                 encoded_q = urllib.parse.quote(keyword)
                 weibo_url = f"https://m.weibo.cn/api/container/getIndex?containerid=100103type%3D3%26q%3D{encoded_q}&page_type=searchall"
@@ -226,7 +428,7 @@ class CrawlerService:
                     "User-Agent": "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36",
                     "Referer": "https://m.weibo.cn/"
                 }
-                resp = await client.get(weibo_url, headers=headers)
+                resp = await self.client.get(weibo_url, headers=headers, timeout=4.0)
                 data = resp.json()
                 local_res = []
                 cards = data.get('data', {}).get('cards', [])
@@ -249,35 +451,102 @@ class CrawlerService:
             except:
                 return []
 
-        async with httpx.AsyncClient(verify=False, timeout=4.0) as client:
-            tasks = []
-            if platform in ["all", "bilibili"]:
-                tasks.append(fetch_bili(client))
-            if platform in ["all", "weibo"]:
-                tasks.append(fetch_weibo(client))
+        tasks = []
+        if platform in ["all", "bilibili"]:
+            tasks.append(fetch_bili())
+        if platform in ["all", "weibo"]:
+            tasks.append(fetch_weibo())
 
-            if tasks:
-                task_results = await asyncio.gather(*tasks, return_exceptions=True)
-                for tr in task_results:
-                    if isinstance(tr, list):
-                        results.extend(tr)
+        if tasks:
+            task_results = await asyncio.gather(*tasks, return_exceptions=True)
+            for tr in task_results:
+                if isinstance(tr, list):
+                    results.extend(tr)
 
-            if platform in ["all", "douyin"]:
-                results.append({
-                    "platform": "抖音",
-                    "name": f"搜索: {keyword}",
-                    "desc": "点击直接跳转抖音网页版搜索",
-                    "pic": "https://lf1-cdn-tos.bytegoofy.com/goofy/ies/douyin_web/public/favicon.ico",
-                    "url": f"https://www.douyin.com/search/{urllib.parse.quote(keyword)}"
-                })
+        if platform in ["all", "douyin"]:
+            results.append({
+                "platform": "抖音",
+                "name": f"搜索: {keyword}",
+                "desc": "点击直接跳转抖音网页版搜索",
+                "pic": "https://lf1-cdn-tos.bytegoofy.com/goofy/ies/douyin_web/public/favicon.ico",
+                "url": f"https://www.douyin.com/search/{urllib.parse.quote(keyword)}"
+            })
 
-            if platform in ["all", "xiaohongshu"]:
-                results.append({
-                    "platform": "小红书",
-                    "name": f"搜索: {keyword}",
-                    "desc": "点击直接跳转小红书搜索页",
-                    "pic": "https://ci.xiaohongshu.com/fd579468-69cb-4190-8457-377eb60c1d68",
-                    "url": f"https://www.xiaohongshu.com/search_result?keyword={urllib.parse.quote(keyword)}"
-                })
+        if platform in ["all", "xiaohongshu"]:
+            results.append({
+                "platform": "小红书",
+                "name": f"搜索: {keyword}",
+                "desc": "点击直接跳转小红书搜索页",
+                "pic": "https://ci.xiaohongshu.com/fd579468-69cb-4190-8457-377eb60c1d68",
+                "url": f"https://www.xiaohongshu.com/search_result?keyword={urllib.parse.quote(keyword)}"
+            })
+
+        return results
+
+
+# 分页搜索游标：记录每个平台取到第几页、是否已到底；合并结果覆盖已取到的全部页，
+# 后面的页名次靠后，新结果总是接在已显示的结果之后
+class SearchCursor:
+    def __init__(self, crawler, keyword, platform="all"):
+        self.crawler = crawler
+        self.keyword = keyword
+        self.sources = crawler._platform_sources(platform)
+        self.results = [[] for _ in self.sources]
+        self.pages = [0] * len(self.sources)
+        self.exhausted = [False] * len(self.sources)
+        self._next = None
+
+    @property
+    def has_more(self):
+        return not all(self.exhausted)
+
+    def merged(self):
+        return self.crawler.merge_results(self.results)
+
+    def _accept(self, i, page, songs):
+        name = self.sources[i][0]
+        self.pages[i] = page
+        self.results[i] = self.results[i] + songs
+        # 不满一页（含请求失败返回空）视为到底
+        if len(songs) < self.crawler.page_size.get(name, 1): self.exhausted[i] = True
+
+    async def stream(self):
+        # 第一页：每有一个平台返回就产出一次 (当前合并结果, 仍在等待的平台数)
+        order = {asyncio.create_task(self.crawler._cached_search(name, func, self.keyword)): i
+                 for i, (name, func) in enumerate(self.sources)}
+        pending = set(order)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    self._accept(order[task], 1, task.result())
+                yield self.merged(), len(pending)
+        finally:
+            for task in pending: task.cancel()
+
+    @property
+    def started(self):
+        # 所有平台的第一页都已返回（stream 结束）才能翻页，否则会重复请求仍在等待的第一页
+        return all(self.pages)
+
+    def prefetch(self):
+        # 在后台开始取下一页；已有进行中的请求时直接复用，第一页未全部返回时不做任何事
+        if self._next is None and self.has_more and self.started:
+            self._next = asyncio.create_task(self._fetch_next())
+        return self._next
+
+    async def next_page(self):
+        task = self.prefetch()
+        if task is not None: await asyncio.shield(task)
+        return self.merged()
 
-        return results
\ No newline at end of file
+    async def _fetch_next(self):
+        try:
+            todo = [(i, self.pages[i] + 1) for i in range(len(self.sources)) if not self.exhausted[i]]
+            pages = await asyncio.gather(*[
+                self.crawler._cached_search(self.sources[i][0], self.sources[i][1], self.keyword, page)
+                for i, page in todo])
+            for (i, page), songs in zip(todo, pages):
+                self._accept(i, page, songs)
+        finally:
+            self._next = None
@@ -0,0 +1,69 @@
+import asyncio
+
+from services.ranking import SOURCE_PLATFORM, group_key
+
+
+# 当前来源解析或下载失败时换源：优先用搜索合并时留下的 alternates，没有则到其他平台搜同名同歌手，
+# 各候选并行解析下载，预算内第一个拿到有效文件的胜出，其余取消（已下载的部分留作续传）
+class SourceFailover:
+    def __init__(self, helper, crawler, budget=8.0, max_candidates=3):
+        self.helper = helper
+        self.crawler = crawler
+        self.budget = budget
+        self.max_candidates = max_candidates
+
+    async def candidates(self, song):
+        found = [dict(a) for a in song.get("alternates", [])]
+        if not found:
+            key = group_key(song)
+            own = SOURCE_PLATFORM.get(song.get('source'))
+            results = await self.crawler.search_platforms(f"{song['name']} {song['artist']}", exclude=(own,))
+            seen = set()
+            for songs in results:
+                for s in songs:
+                    ident = (s['source'], s['id'])
+                    if group_key(s) != key or ident in seen: continue
+                    seen.add(ident)
+                    found.append(s)
+        ranker = self.crawler.ranker
+        found.sort(key=lambda s: -ranker.score(s['source']))
+        return found[:self.max_candidates]
+
+    async def _try(self, song):
+        try:
+            url = await self.crawler.resolve_play_url(song)
+            ok, path = False, None
+            if url:
+                ok, path = await self.helper.download_file(url, "temp_cache", self.helper.cache_filename(song, url))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"换源失败 [{song.get('source')}]: {e}")
+            ok = False
+        self.crawler.ranker.record_result(song['source'], ok)
+        return path if ok else None
+
+    async def acquire(self, song):
+        # 返回 (胜出的候选歌曲, 本地路径)，全部失败或超出预算时返回 (None, None)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget
+        try:
+            candidates = await asyncio.wait_for(self.candidates(song), self.budget)
+        except asyncio.TimeoutError:
+            return None, None
+        tasks = {asyncio.create_task(self._try(c)): c for c in candidates}
+        try:
+            while tasks:
+                remaining = deadline - loop.time()
+                if remaining <= 0: break
+                done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done: break
+                for task in done:
+                    candidate = tasks.pop(task)
+                    path = task.result()
+                    if path:
+                        self.crawler.ranker.prefer(song, candidate['source'])
+                        return candidate, path
+            return None, None
+        finally:
+            for task in tasks: task.cancel()
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import os
+
+# 按文件头识别图片格式；RIFF 需再确认第 8 字节起是 WEBP
+IMAGE_MAGIC = [(b"\xff\xd8\xff", "jpg"), (b"\x89PNG\r\n\x1a\n", "png"), (b"GIF87a", "gif"), (b"GIF89a", "gif"),
+               (b"BM", "bmp")]
+# 单张图片大小上限，超过视为异常响应
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+
+
+def image_type(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP": return "webp"
+    for magic, ext in IMAGE_MAGIC:
+        if data.startswith(magic): return ext
+    return None
+
+
+# 图片保存：按文件头判断是否为真实图片（不再套用音频的 100KB 下限），按内容哈希命名，
+# 不同 URL 返回的同一张图只保存一份；批量下载时限制并发数
+class ImageDownloader:
+    def __init__(self, helper, folder="downloads/images", max_concurrent=4):
+        self.helper = helper
+        self.folder = folder
+        self.max_concurrent = max_concurrent
+        # 内容哈希 -> 已保存的路径；首次使用时扫描目录，兼容之前随机命名的文件
+        self.hashes = None
+        self._scan = None
+        self._saving = {}
+
+    async def _known(self):
+        if self.hashes is None:
+            if self._scan is None: self._scan = asyncio.ensure_future(asyncio.to_thread(self._scan_folder))
+            self.hashes = await asyncio.shield(self._scan)
+        return self.hashes
+
+    def _scan_folder(self):
+        hashes = {}
+        if not os.path.exists(self.folder): return hashes
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith(".part"): continue
+                try:
+                    with open(entry.path, 'rb') as f:
+                        hashes.setdefault(hashlib.sha256(f.read()).hexdigest(), entry.path)
+                except OSError:
+                    pass
+        return hashes
+
+    async def _fetch(self, url):
+        # 流式读取：Content-Length 超限直接放弃，读取中累计超过上限即中止；凑够文件头就判断类型，不是图片不再往下读
+        async with self.helper.net.client.stream('GET', url, headers=self.helper.base_headers, timeout=15,
+                                                 follow_redirects=True) as resp:
+            if resp.status_code != 200: raise ValueError(f"HTTP {resp.status_code}")
+            length = resp.headers.get("Content-Length", "")
+            if length.isdigit() and int(length) > MAX_IMAGE_BYTES: raise ValueError("文件过大")
+            chunks, size, ext = [], 0, None
+            sha = hashlib.sha256()
+            async for chunk in resp.aiter_bytes():
+                chunks.append(chunk)
+                sha.update(chunk)
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES: raise ValueError("文件过大")
+                if ext is None and size >= 12:
+                    ext = image_type(b"".join(chunks)[:12])
+                    if not ext: raise ValueError("不是图片")
+        data = b"".join(chunks)
+        ext = ext or image_type(data)
+        if not ext: raise ValueError("不是图片")
+        return data, ext, sha.hexdigest()
+
+    async def download(self, url):
+        # 返回 (状态, 路径或原因)，状态为 saved / duplicate / failed
+        try:
+            data, ext, digest = await self._fetch(url)
+        except Exception as e:
+            return "failed", str(e)
+        hashes = await self._known()
+        if digest in hashes and os.path.exists(hashes[digest]): return "duplicate", hashes[digest]
+        # 同一内容正在写入时等它完成，避免并发下重复保存
+        pending = self._saving.get(digest)
+        if pending:
+            try:
+                return "duplicate", await asyncio.shield(pending)
+            except Exception as e:
+                return "failed", str(e)
+        path = self.helper.target_path(self.folder, f"img_{digest[:16]}.{ext}")
+        task = self._saving[digest] = asyncio.ensure_future(asyncio.to_thread(self._write, path, data))
+        try:
+            await task
+        except Exception as e:
+            return "failed", str(e)
+        finally:
+            self._saving.pop(digest, None)
+        hashes[digest] = path
+        return "saved", path
+
+    def _write(self, path, data):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(f"{path}.part", 'wb') as f:
+            f.write(data)
+        os.replace(f"{path}.part", path)
+        return path
+
+    async def download_all(self, urls, on_progress=None):
+        # 返回各状态的计数；on_progress(已完成数, 总数) 每完成一张调用一次
+        urls = list(dict.fromkeys(u for u in urls if u))
+        counts = {"saved": 0, "duplicate": 0, "failed": 0}
+        sem = asyncio.Semaphore(self.max_concurrent)
+
+        async def one(url):
+            async with sem:
+                status, _ = await self.download(url)
+            counts[status] += 1
+            if on_progress: on_progress(sum(counts.values()), len(urls))
+
+        await asyncio.gather(*[one(u) for u in urls])
+        return counts
@@ -0,0 +1,48 @@
+import bisect
+from collections import deque
+
+# 直方图桶上界（毫秒），最后一个桶收集超出上界的样本
+BUCKETS_MS = (100, 200, 400, 800, 1600, 3200, 6400)
+
+
+# 记录各平台请求耗时，提供分位数（用于对冲请求）和直方图（用于调整超时预算）
+class LatencyTracker:
+    def __init__(self, window=100, min_samples=8):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = {}
+        self.histograms = {}
+        self.timeouts = {}
+        self.hedges = {}
+
+    def record(self, platform, seconds):
+        self.samples.setdefault(platform, deque(maxlen=self.window)).append(seconds)
+        hist = self.histograms.setdefault(platform, [0] * (len(BUCKETS_MS) + 1))
+        hist[bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+
+    def record_timeout(self, platform):
+        self.timeouts[platform] = self.timeouts.get(platform, 0) + 1
+
+    def record_hedge(self, platform):
+        self.hedges[platform] = self.hedges.get(platform, 0) + 1
+
+    def percentile(self, platform, q):
+        data = self.samples.get(platform)
+        if not data or len(data) < self.min_samples: return None
+        ordered = sorted(data)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        stats = {}
+        for platform in set(self.samples) | set(self.timeouts):
+            hist = self.histograms.get(platform, [0] * (len(BUCKETS_MS) + 1))
+            labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+            stats[platform] = {
+                "count": len(self.samples.get(platform, ())),
+                "p50": self.percentile(platform, 0.5),
+                "p95": self.percentile(platform, 0.95),
+                "timeouts": self.timeouts.get(platform, 0),
+                "hedges": self.hedges.get(platform, 0),
+                "histogram": dict(zip(labels, hist)),
+            }
+        return stats
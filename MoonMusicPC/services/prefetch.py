@@ -0,0 +1,65 @@
+import asyncio
+
+from core.net import RateLimiter
+
+
+# 沿播放列表向后预取若干首歌：近的优先，列表或播放位置变化时取消不再需要的任务
+class PrefetchScheduler:
+    def __init__(self, helper, crawler, depth=2, max_concurrent=2, max_kbps=0):
+        self.helper = helper
+        self.crawler = crawler
+        self.depth = depth
+        self.max_concurrent = max_concurrent
+        self.limiter = RateLimiter(max_kbps * 1024) if max_kbps else None
+        self.queue = []
+        self.running = {}
+        # 预取完成回调 (song, path)，播放器据此准备无缝衔接
+        self.on_ready = None
+
+    @staticmethod
+    def _key(song):
+        return song.get('source'), song.get('id')
+
+    def schedule(self, playlist, index, start=True):
+        wanted, keys = [], set()
+        current = self._key(playlist[index % len(playlist)]) if playlist else None
+        if playlist and self.depth > 0:
+            for step in range(1, self.depth + 1):
+                song = playlist[(index + step) % len(playlist)]
+                key = self._key(song)
+                if key == current or key in keys: continue
+                wanted.append(song)
+                keys.add(key)
+        for key, task in list(self.running.items()):
+            # 切到的歌曲若正在预取则保留，前台的 download_file 会直接加入该下载而不是中止后续传
+            if key not in keys and key != current: task.cancel()
+        # 队列按优先级（离当前歌曲的距离）排列
+        self.queue = [s for s in wanted if self._key(s) not in self.running] if start else []
+        self._pump()
+
+    def cancel_all(self):
+        self.schedule([], 0, start=False)
+
+    def _pump(self):
+        while self.queue and len(self.running) < self.max_concurrent:
+            song = self.queue.pop(0)
+            key = self._key(song)
+            task = asyncio.create_task(self._fetch(song))
+            self.running[key] = task
+            task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+
+    def _on_done(self, key, task):
+        if self.running.get(key) is task: del self.running[key]
+        self._pump()
+
+    async def _fetch(self, song):
+        path = self.helper.open_local(song)
+        if not path:
+            url = await self.crawler.resolve_play_url(song)
+            if not url: return
+            ok, path = await self.helper.download_file(url, "temp_cache", self.helper.cache_filename(song, url),
+                                                       limiter=self.limiter)
+            if not ok: return
+            self.helper.audio_cache.protect(path)
+            self.helper.remember_cache(song, path)
+        if self.on_ready: self.on_ready(song, path)
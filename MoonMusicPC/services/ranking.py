@@ -0,0 +1,94 @@
+import re
+
+from core.store import UserDataStore
+from services.cache import normalize_keyword
+
+# 歌曲 source 字段与搜索/延迟统计里的平台名对应关系
+SOURCE_PLATFORM = {"网易": "netease", "QQ": "qq", "酷狗": "kugou"}
+# 没有延迟样本时按 1 秒估计
+DEFAULT_LATENCY = 1.0
+
+_PUNCT = re.compile(r"[\s\-_·・.,，。'\"“”‘’!！?？:：]+")
+_ARTIST_SEP = re.compile(r"\s*[/、&,，;；]\s*|\s+(?:feat\.?|ft\.?)\s+")
+
+
+def group_key(song):
+    # 标题去掉空白和标点（括号内容保留，Live/伴奏等版本仍视为不同歌曲），歌手只取第一位
+    title = _PUNCT.sub("", normalize_keyword(song.get('name', '')))
+    artist = _ARTIST_SEP.split(normalize_keyword(song.get('artist', '')))[0]
+    return title, _PUNCT.sub("", artist)
+
+
+# 跨平台合并搜索结果：同名同歌手的歌曲归为一组，按各平台历史成功率和搜索延迟挑出首选来源，
+# 其余来源放进 alternates 备用。合并只做一次哈希分组，结果数量翻倍耗时也只是线性增长
+class SourceRanker:
+    def __init__(self, latency, path=None, delay=2.0):
+        self.latency = latency
+        self.success = {}
+        self.failure = {}
+        # 换源成功后记下该歌曲可用的平台，下次合并时优先
+        self.preferred = {}
+        # 统计更新后延迟 delay 秒在后台写入 path，连续的更新合并成一次
+        self.store = UserDataStore(path, self._snapshot, delay=delay) if path else None
+
+    def record_result(self, source, ok):
+        platform = SOURCE_PLATFORM.get(source, source)
+        counter = self.success if ok else self.failure
+        counter[platform] = counter.get(platform, 0) + 1
+        if self.store: self.store.record()
+
+    def prefer(self, song, source):
+        self.preferred["\t".join(group_key(song))] = source
+        if self.store: self.store.record()
+
+    def success_rate(self, platform):
+        # 拉普拉斯平滑，新平台从 0.5 起步
+        ok, bad = self.success.get(platform, 0), self.failure.get(platform, 0)
+        return (ok + 1) / (ok + bad + 2)
+
+    def score(self, source):
+        platform = SOURCE_PLATFORM.get(source, source)
+        latency = self.latency.percentile(platform, 0.5)
+        return self.success_rate(platform) / (1 + (DEFAULT_LATENCY if latency is None else latency))
+
+    def merge(self, results):
+        # results 为各平台的结果列表；分组顺序按组内最好的名次，其次按覆盖的平台数
+        groups = {}
+        for songs in results:
+            for rank, song in enumerate(songs):
+                key = group_key(song)
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = group = {"rank": rank, "order": len(groups), "songs": []}
+                elif rank < group["rank"]:
+                    group["rank"] = rank
+                group["songs"].append(song)
+        scores = {}
+        merged = []
+        ordered = sorted(groups.items(), key=lambda kv: (kv[1]["rank"], -len(kv[1]["songs"]), kv[1]["order"]))
+        for key, group in ordered:
+            songs = group["songs"]
+            if len(songs) > 1:
+                for s in songs:
+                    if s['source'] not in scores: scores[s['source']] = self.score(s['source'])
+                preferred = self.preferred.get("\t".join(key))
+                songs = sorted(songs, key=lambda s: (s['source'] != preferred, -scores[s['source']]))
+            best = dict(songs[0])
+            best["alternates"] = [{k: v for k, v in s.items() if k != "alternates"} for s in songs[1:]]
+            merged.append(best)
+        return merged
+
+    def _snapshot(self):
+        return {"success": dict(self.success), "failure": dict(self.failure), "preferred": dict(self.preferred)}
+
+    def save(self):
+        # 退出时把尚未写入的更新立即落盘
+        if self.store: self.store.flush_sync()
+
+    def load(self):
+        if not self.store: return
+        data, _ = self.store.load()
+        if not data: return
+        self.success = data.get("success", {})
+        self.failure = data.get("failure", {})
+        self.preferred = data.get("preferred", {})
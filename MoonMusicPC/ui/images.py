@@ -0,0 +1,24 @@
+import asyncio
+
+import flet as ft
+
+
+def cached_image(images, url, variant="thumb", **kwargs):
+    # 返回一个占位容器：本地已缓存时直接显示，否则缓存完成后再填入图片，缓存失败退回远程地址
+    box = ft.Container(width=kwargs.get("width"), height=kwargs.get("height"),
+                       border_radius=kwargs.get("border_radius"), bgcolor="#333333")
+    path = images.cached(url, variant) if url else None
+    if path or not url:
+        box.content = ft.Image(src=path or url, **kwargs) if url else None
+        return box
+
+    async def fill():
+        path = await images.get(url, variant)
+        box.content = ft.Image(src=path or url, **kwargs)
+        try:
+            box.update()
+        except:
+            pass  # 还没挂到页面上，随下一次 page.update 显示
+
+    asyncio.create_task(fill())
+    return box
@@ -0,0 +1,156 @@
+import asyncio
+
+import flet as ft
+
+SOURCE_COLORS = {"网易": "#C20C0C", "QQ": "#31c27c", "酷狗": "#0091ff"}
+
+
+# 歌曲列表中的一行；控件只创建一次，换列表时通过 bind 改写内容重复使用
+class SongRow:
+    def __init__(self, on_play, on_download, accent, card_color, images=None):
+        self.images = images
+        self.song = None
+        self.index = -1
+        self.pic = ""
+        self.cover_loaded = False
+        self.image = None
+        self.cover = ft.Container(width=50, height=50, border_radius=5, bgcolor="#333333",
+                                  clip_behavior=ft.ClipBehavior.ANTI_ALIAS)
+        self.title = ft.Text("", weight="bold", size=14)
+        self.source = ft.Text("", size=10, color="white")
+        self.source_box = ft.Container(content=self.source, bgcolor="grey", padding=4, border_radius=4)
+        self.offline = ft.Icon(ft.Icons.OFFLINE_PIN, size=16, color=accent, tooltip="可离线播放", visible=False)
+        self.artist = ft.Text("", size=12, color="grey")
+        self.control = ft.Container(
+            content=ft.Row([
+                self.cover,
+                ft.Column([
+                    ft.Row([self.title, self.source_box, self.offline], spacing=5),
+                    self.artist
+                ], spacing=2, expand=True),
+                ft.IconButton(ft.Icons.PLAY_CIRCLE_FILL, icon_color=accent, on_click=lambda e: on_play(self.index)),
+                ft.IconButton(ft.Icons.DOWNLOAD_ROUNDED, icon_color="white54", on_click=lambda e: on_download(self.song))
+            ]), bgcolor=card_color, padding=10, border_radius=10
+        )
+
+    def bind(self, song, index, offline=False):
+        self.song = song
+        self.index = index
+        self.title.value = song['name']
+        self.source.value = song.get('source', '未知')
+        self.source_box.bgcolor = SOURCE_COLORS.get(song.get('source', ''), "grey")
+        self.artist.value = song['artist']
+        self.offline.visible = offline
+        pic = song.get('pic') or ""
+        if pic != self.pic:
+            # 封面换了先显示占位，滚动到可见时再加载
+            self.pic = pic
+            self.cover_loaded = False
+            self.cover.content = None
+
+    def load_cover(self):
+        # 有图片缓存时用本地缩略图；未缓存的先保持占位，后台缓存好再刷新这一行
+        if self.cover_loaded or not self.pic: return False
+        self.cover_loaded = True
+        src = self.images.cached(self.pic) if self.images else self.pic
+        if src is None:
+            asyncio.create_task(self._fetch_cover(self.pic))
+            return False
+        self._show_cover(src)
+        return True
+
+    async def _fetch_cover(self, pic):
+        path = await self.images.get(pic)
+        if pic != self.pic: return  # 等待期间行已被复用给别的歌曲
+        self._show_cover(path or pic)
+        try:
+            self.cover.update()
+        except:
+            pass
+
+    def _show_cover(self, src):
+        if self.image is None:
+            self.image = ft.Image(src=src, width=50, height=50, fit="cover", cache_width=100, cache_height=100)
+        else:
+            self.image.src = src
+        self.cover.content = self.image
+
+
+# 按需构建的歌曲列表：先渲染一页，滚动接近底部时再追加下一页；行控件放在池里重复使用，
+# 封面只给视口附近的行加载（传入 images 时走本地图片缓存）。
+# header/footer 是列表前后的固定控件（标题、卡片、进度条等）
+class SongListView:
+    def __init__(self, list_view, on_play, on_download, is_offline=None, accent="#00E676", card_color="#252525",
+                 page_size=30, row_extent=80, images=None):
+        self.list_view = list_view
+        self.images = images
+        self.on_play = on_play
+        self.on_download = on_download
+        self.is_offline = is_offline
+        self.accent = accent
+        self.card_color = card_color
+        self.page_size = page_size
+        self.row_extent = row_extent
+        self.rows = []
+        self.songs = []
+        self.header = []
+        self.footer = []
+        self.rendered = 0
+        self.mark_offline = False
+        self.pixels = 0
+        self.viewport = 800
+        # 所有歌曲都已渲染且滚动到距底部 near_end_rows 行以内时回调，用于提前加载下一页
+        self.on_near_end = None
+        self.near_end_rows = 15
+        list_view.on_scroll = self._on_scroll
+        list_view.scroll_interval = 150
+
+    def show(self, songs, header=None, footer=None, mark_offline=False, keep_position=False):
+        # keep_position 用于同一次搜索的结果陆续到达时刷新，不收回已经展开的页
+        self.songs = songs
+        self.header = header or []
+        self.footer = footer or []
+        self.mark_offline = mark_offline
+        if not keep_position:
+            self.pixels = 0
+            self.rendered = 0
+        self.rendered = min(len(songs), max(self.rendered, self.page_size))
+        self._render()
+
+    def _row(self, i):
+        while len(self.rows) <= i:
+            self.rows.append(SongRow(lambda idx: self.on_play(self.songs, idx), self.on_download,
+                                     self.accent, self.card_color, self.images))
+        row = self.rows[i]
+        song = self.songs[i]
+        if row.song is not song or row.index != i:
+            row.bind(song, i, bool(self.mark_offline and self.is_offline and self.is_offline(song)))
+        return row
+
+    def _render(self):
+        rows = [self._row(i).control for i in range(self.rendered)]
+        self.list_view.controls = self.header + rows + self.footer
+        self._load_visible()
+
+    def _load_visible(self):
+        # 行高固定，按滚动位置估算可见范围，前后各多加载两行
+        first = max(0, int(self.pixels / self.row_extent) - 2)
+        last = min(self.rendered, int((self.pixels + self.viewport) / self.row_extent) + 2)
+        loaded = False
+        for i in range(first, last):
+            loaded = self.rows[i].load_cover() or loaded
+        return loaded
+
+    def _on_scroll(self, e):
+        self.pixels = e.pixels
+        self.viewport = e.viewport_dimension or self.viewport
+        changed = False
+        if e.max_scroll_extent - e.pixels < self.row_extent * 5 and self.rendered < len(self.songs):
+            self.rendered = min(len(self.songs), self.rendered + self.page_size)
+            self._render()
+            changed = True
+        changed = self._load_visible() or changed
+        if changed: self.list_view.update()
+        if self.on_near_end and self.rendered == len(self.songs) and self.songs and \
+                e.max_scroll_extent - e.pixels < self.row_extent * self.near_end_rows:
+            self.on_near_end()